@@ -1,3 +1,4 @@
+import os
 from logging.config import fileConfig
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.pool import NullPool
@@ -8,6 +9,10 @@ import asyncio
 
 config = context.config
 
+# DATABASE_URL из окружения (sqlite+aiosqlite или postgresql+asyncpg) важнее alembic.ini
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+
 
 # Конфигурация логгирования
 if config.config_file_name is not None:
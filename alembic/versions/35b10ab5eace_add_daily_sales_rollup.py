@@ -0,0 +1,61 @@
+"""add_daily_sales_rollup
+
+Revision ID: 35b10ab5eace
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '35b10ab5eace'
+down_revision: Union[str, Sequence[str], None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create daily_sales rollup and backfill it from orders."""
+    op.create_table(
+        'daily_sales',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('delivery', sa.String(), nullable=False),
+        sa.Column('payment', sa.String(), nullable=False),
+        sa.Column('orders_count', sa.Integer(), nullable=False),
+        sa.Column('items_count', sa.Integer(), nullable=False),
+        sa.Column('gross', sa.Float(), nullable=False),
+        sa.Column('discount', sa.Float(), nullable=False),
+        sa.Column('delivery_cost', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'status', 'delivery', 'payment'),
+    )
+    op.execute(
+        """
+        INSERT INTO daily_sales
+            (day, status, delivery, payment, orders_count, items_count,
+             gross, discount, delivery_cost)
+        SELECT date(o.created_at), o.status, o.delivery, o.payment,
+               count(o.id),
+               coalesce(sum(i.items_count), 0),
+               coalesce(sum(o.total_price), 0.0),
+               coalesce(sum(i.subtotal * coalesce(o.discount, 0) / 100.0), 0.0),
+               coalesce(sum(o.delivery_cost), 0.0)
+        FROM orders o
+        LEFT JOIN (
+            SELECT order_id, sum(quantity) AS items_count, sum(total_price) AS subtotal
+            FROM order_items
+            GROUP BY order_id
+        ) i ON i.order_id = o.id
+        WHERE o.created_at IS NOT NULL
+        GROUP BY date(o.created_at), o.status, o.delivery, o.payment
+        """
+    )
+
+
+def downgrade() -> None:
+    """Drop daily_sales rollup."""
+    op.drop_table('daily_sales')
@@ -0,0 +1,44 @@
+"""widen_telegram_ids_for_postgres
+
+Revision ID: 4d8a6c0e5b21
+Revises: 9e4b7d2c1f08
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8a6c0e5b21'
+down_revision: Union[str, Sequence[str], None] = '9e4b7d2c1f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Колонки с Telegram id: в SQLite INTEGER уже 64-битный, менять нечего
+TELEGRAM_ID_COLUMNS = [
+    ('users', 'id'),
+    ('users', 'telegram_id'),
+    ('baskets', 'user_id'),
+    ('couriers', 'user_id'),
+    ('orders', 'user_id'),
+    ('orders_history', 'user_id'),
+]
+
+
+def upgrade() -> None:
+    """Widen Telegram id columns to BIGINT on PostgreSQL."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in TELEGRAM_ID_COLUMNS:
+        op.alter_column(table, column, type_=sa.BigInteger(), existing_type=sa.Integer())
+
+
+def downgrade() -> None:
+    """Narrow Telegram id columns back to INTEGER on PostgreSQL."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in reversed(TELEGRAM_ID_COLUMNS):
+        op.alter_column(table, column, type_=sa.Integer(), existing_type=sa.BigInteger())
@@ -0,0 +1,34 @@
+"""add_telegram_files
+
+Revision ID: 6a3f9e1c7d52
+Revises: e5c1d8b3a470
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3f9e1c7d52'
+down_revision: Union[str, Sequence[str], None] = 'e5c1d8b3a470'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Cache Telegram file_id per uploaded image path."""
+    op.create_table(
+        'telegram_files',
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('file_id', sa.String(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('path'),
+    )
+
+
+def downgrade() -> None:
+    """Drop telegram_files."""
+    op.drop_table('telegram_files')
@@ -0,0 +1,59 @@
+"""add_popularity_and_sales_indexes
+
+Revision ID: 7c41d2e9a0b3
+Revises: 35b10ab5eace
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c41d2e9a0b3'
+down_revision: Union[str, Sequence[str], None] = '35b10ab5eace'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add items.popularity_score and covering indexes for top sellers."""
+    with op.batch_alter_table('items') as batch_op:
+        batch_op.add_column(
+            sa.Column('popularity_score', sa.Integer(), nullable=True, server_default='0')
+        )
+    op.create_index('ix_items_popularity_score', 'items', ['popularity_score'])
+    op.create_index(
+        'ix_order_items_order_item_sales',
+        'order_items',
+        ['order_id', 'item_id', 'quantity', 'total_price'],
+    )
+    op.create_index(
+        'ix_order_items_order_taste_sales',
+        'order_items',
+        ['order_id', 'selected_taste', 'quantity', 'total_price'],
+    )
+    op.create_index('ix_orders_status_created_at', 'orders', ['status', 'created_at'])
+
+    op.execute(
+        """
+        UPDATE items SET popularity_score = (
+            SELECT coalesce(sum(oi.quantity), 0)
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE o.status = 'completed' AND oi.item_id = items.id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Drop popularity_score and top sellers indexes."""
+    op.drop_index('ix_orders_status_created_at', table_name='orders')
+    op.drop_index('ix_order_items_order_taste_sales', table_name='order_items')
+    op.drop_index('ix_order_items_order_item_sales', table_name='order_items')
+    op.drop_index('ix_items_popularity_score', table_name='items')
+    with op.batch_alter_table('items') as batch_op:
+        batch_op.drop_column('popularity_score')
@@ -0,0 +1,37 @@
+"""add_fsm_states
+
+Revision ID: 8d1b5f3e2a94
+Revises: 6a3f9e1c7d52
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d1b5f3e2a94'
+down_revision: Union[str, Sequence[str], None] = '6a3f9e1c7d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Persist aiogram FSM state and data per storage key."""
+    op.create_table(
+        'fsm_states',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=True),
+        sa.Column('data', sa.JSON(none_as_null=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_fsm_states_updated_at', 'fsm_states', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop fsm_states."""
+    op.drop_index('ix_fsm_states_updated_at', table_name='fsm_states')
+    op.drop_table('fsm_states')
@@ -0,0 +1,54 @@
+"""add_order_status_events
+
+Revision ID: 9e4b7d2c1f08
+Revises: c3f1a9d27b64
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7d2c1f08'
+down_revision: Union[str, Sequence[str], None] = 'c3f1a9d27b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create append-only order status events log."""
+    op.create_table(
+        'order_status_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('from_status', sa.String(), nullable=True),
+        sa.Column('to_status', sa.String(), nullable=False),
+        sa.Column('actor', sa.String(), nullable=True),
+        sa.Column('at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_order_status_events_order_id_at', 'order_status_events', ['order_id', 'at']
+    )
+    op.create_index(
+        'ix_order_status_events_to_status_at', 'order_status_events', ['to_status', 'at']
+    )
+    # Достоверно известен только момент создания уже существующих заказов
+    op.execute(
+        """
+        INSERT INTO order_status_events (order_id, from_status, to_status, actor, at)
+        SELECT id, NULL, 'waiting_for_courier', NULL, created_at
+        FROM orders
+        WHERE created_at IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    """Drop order status events log."""
+    op.drop_index('ix_order_status_events_to_status_at', table_name='order_status_events')
+    op.drop_index('ix_order_status_events_order_id_at', table_name='order_status_events')
+    op.drop_table('order_status_events')
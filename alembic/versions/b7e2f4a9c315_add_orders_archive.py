@@ -0,0 +1,87 @@
+"""add_orders_archive
+
+Revision ID: b7e2f4a9c315
+Revises: 4d8a6c0e5b21
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f4a9c315'
+down_revision: Union[str, Sequence[str], None] = '4d8a6c0e5b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create cold tables for archived orders and their items."""
+    op.create_table(
+        'orders_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column(
+            'user_id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False
+        ),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('basket_id', sa.Integer(), nullable=True),
+        sa.Column('payment', sa.String(), nullable=False),
+        sa.Column('delivery', sa.String(), nullable=False),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('telephone', sa.String(), nullable=True),
+        sa.Column('metro_line', sa.String(), nullable=True),
+        sa.Column('metro_station', sa.String(), nullable=True),
+        sa.Column('preferred_time', sa.String(), nullable=True),
+        sa.Column('time_slot', sa.String(), nullable=True),
+        sa.Column('delivery_cost', sa.Float(), nullable=True),
+        sa.Column('total_price', sa.Float(), nullable=False),
+        sa.Column('discount', sa.Integer(), nullable=True),
+        sa.Column('promocode', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('bot_message_ids', sa.JSON(), nullable=True),
+        sa.Column('courier_id', sa.Integer(), nullable=True),
+        sa.Column('postal_full_name', sa.String(), nullable=True),
+        sa.Column('postal_phone', sa.String(), nullable=True),
+        sa.Column('postal_address', sa.String(), nullable=True),
+        sa.Column('postal_index', sa.String(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_orders_archive_created_at', 'orders_archive', ['created_at'])
+    op.create_index(
+        'ix_orders_archive_status_created_at', 'orders_archive', ['status', 'created_at']
+    )
+    op.create_index(
+        'ix_orders_archive_user_id_created_at', 'orders_archive', ['user_id', 'created_at']
+    )
+    op.create_table(
+        'order_items_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=True),
+        sa.Column('item_id', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price_per_item', sa.Float(), nullable=False),
+        sa.Column('total_price', sa.Float(), nullable=False),
+        sa.Column('tastes', sa.String(), nullable=True),
+        sa.Column('selected_taste', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['orders_archive.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_order_items_archive_order_id', 'order_items_archive', ['order_id']
+    )
+
+
+def downgrade() -> None:
+    """Drop archive tables (archived orders are lost, move them back first)."""
+    op.drop_index('ix_order_items_archive_order_id', table_name='order_items_archive')
+    op.drop_table('order_items_archive')
+    op.drop_index('ix_orders_archive_user_id_created_at', table_name='orders_archive')
+    op.drop_index('ix_orders_archive_status_created_at', table_name='orders_archive')
+    op.drop_index('ix_orders_archive_created_at', table_name='orders_archive')
+    op.drop_table('orders_archive')
@@ -0,0 +1,52 @@
+"""add_hot_filter_indexes
+
+Revision ID: c3f1a9d27b64
+Revises: 7c41d2e9a0b3
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f1a9d27b64'
+down_revision: Union[str, Sequence[str], None] = '7c41d2e9a0b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add indexes for the hot filters in the API and bot handlers."""
+    # Заказы пользователя и счетчик заказов клиента в карточке
+    op.create_index('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at'])
+    # Активные / завершенные / отмененные заказы курьера
+    op.create_index(
+        'ix_orders_courier_id_status_created_at',
+        'orders',
+        ['courier_id', 'status', 'created_at'],
+    )
+    op.create_index(
+        'ix_basket_items_basket_id_item_id', 'basket_items', ['basket_id', 'item_id']
+    )
+    op.create_index(
+        'ix_item_taste_association_item_id_taste_id',
+        'item_taste_association',
+        ['item_id', 'taste_id'],
+    )
+    op.create_index('ix_users_is_banned', 'users', ['is_banned'])
+    op.create_index('ix_items_category_id', 'items', ['category_id'])
+
+
+def downgrade() -> None:
+    """Drop hot filter indexes."""
+    op.drop_index('ix_items_category_id', table_name='items')
+    op.drop_index('ix_users_is_banned', table_name='users')
+    op.drop_index(
+        'ix_item_taste_association_item_id_taste_id', table_name='item_taste_association'
+    )
+    op.drop_index('ix_basket_items_basket_id_item_id', table_name='basket_items')
+    op.drop_index('ix_orders_courier_id_status_created_at', table_name='orders')
+    op.drop_index('ix_orders_user_id_created_at', table_name='orders')
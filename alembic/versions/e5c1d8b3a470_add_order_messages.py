@@ -0,0 +1,57 @@
+"""add_order_messages
+
+Revision ID: e5c1d8b3a470
+Revises: b7e2f4a9c315
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c1d8b3a470'
+down_revision: Union[str, Sequence[str], None] = 'b7e2f4a9c315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Track bot messages per (chat, message) and drop orders.bot_message_ids."""
+    op.create_table(
+        'order_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'chat_id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False
+        ),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_order_messages_order_id_chat_id_message_id',
+        'order_messages',
+        ['order_id', 'chat_id', 'message_id'],
+        unique=True,
+    )
+    # Старые id сообщений без chat_id адресно не удалить, их не переносим
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('bot_message_ids')
+    with op.batch_alter_table('orders_archive', schema=None) as batch_op:
+        batch_op.drop_column('bot_message_ids')
+
+
+def downgrade() -> None:
+    """Restore orders.bot_message_ids and drop order_messages."""
+    with op.batch_alter_table('orders_archive', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bot_message_ids', sa.JSON(), nullable=True))
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bot_message_ids', sa.JSON(), nullable=True))
+    op.drop_index(
+        'ix_order_messages_order_id_chat_id_message_id', table_name='order_messages'
+    )
+    op.drop_table('order_messages')
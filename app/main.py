@@ -4,10 +4,11 @@ import os
 import re
 import uuid
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Optional
 
 import uvicorn
+from aiogram.types import Update
 from aiogram.utils.markdown import text
 from dotenv import load_dotenv
 from fastapi import (
@@ -20,18 +21,22 @@ from fastapi import (
     Header,
     HTTPException,
     Path,
+    Request,
     UploadFile,
     status,
 )
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import delete, func, select
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 
+from bot import webhook
 from bot.bot import ADMINS, COURIERS, bot, check_required_env, dp, format_order_info, get_courier_keyboard
-from database.db import engine, get_db
+from database import query_budget
+from database.db import AsyncSessionLocal, engine, get_db, get_read_db, read_engine
 from database.models import (
     Base,
     Basket,
@@ -45,15 +50,21 @@ from database.models import (
     Taste,
     item_taste_association,
 )
-from middlewares.ban import BannedUserMiddleware
+from database.writer import writer
+from middlewares.ban import BannedUserMiddleware, ban_cache
+from middlewares.bypass import SkipStaticMiddleware
+from middlewares.metrics import MetricsMiddleware
+from middlewares.query_budget import QueryBudgetMiddleware
+from middlewares.rate_limit import RateLimitMiddleware
+from services import analytics, archive, catalog, metrics, order_messages, sales_rollup
+from services.leader import keep_running, leader, periodic
+from services.order_status import record_status_change
 from typization.models import (
     BasketItemCreate,
     BasketItemUpdate,
     BasketResponse,
     OrderFromBasketCreate,
     OrderResponse,
-    Sale,
-    SalesItem,
     SalesResponse,
     UserRegisterModel,
 )
@@ -87,42 +98,109 @@ async def save_upload_file(upload_file: UploadFile) -> str:
     return f"/uploads/{unique_filename}"
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def backfill_sales_rollup():
+    async with AsyncSessionLocal() as session:
+        if await sales_rollup.rebuild_if_empty(session):
+            await session.commit()
+            logger.info("daily_sales backfilled from orders")
+
+
+async def archive_old_orders():
+    moved = await archive.archive_orders()
+    if moved:
+        logger.info(f"Archived {moved} orders")
+
+
+def leader_jobs() -> list:
+    """Фоновые задачи, которые должны идти ровно в одном процессе"""
+    jobs = [backfill_sales_rollup]
+    if archive.ARCHIVE_INTERVAL_HOURS > 0:
+        jobs.append(periodic(archive.ARCHIVE_INTERVAL_HOURS * 3600, archive_old_orders))
 
-    bot_task = None
     if os.getenv("START_BOT", "true").lower() == "true":
         try:
             check_required_env()
-            bot_task = asyncio.create_task(dp.start_polling(bot))
+            if webhook.webhook_enabled():
+                # Апдейты приходят в /telegram/webhook/{secret} любого воркера
+                jobs.append(lambda: webhook.setup_webhook(bot, dp))
+            else:
+                # Сигналы остановки обрабатывает uvicorn, а сессию бота закрывает lifespan:
+                # иначе polling завершался бы по SIGTERM, и keep_running поднимал бы его снова
+                jobs.append(
+                    keep_running(
+                        lambda: dp.start_polling(
+                            bot, handle_signals=False, close_bot_session=False
+                        ),
+                        "bot_polling",
+                    )
+                )
         except Exception as e:
             logger.warning(f"Cannot start bot: {str(e)}")
+    return jobs
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    # Забаненных немного: держим весь набор в памяти, проверка без запроса к БД
+    await ban_cache.preload()
+
+    await writer.start()
+
+    # HTTP обслуживает каждый воркер, бот и фоновые задачи — только лидер
+    leader.start(leader_jobs())
 
     yield
 
-    if bot_task:
-        bot_task.cancel()
-        try:
-            await bot_task
-        except asyncio.CancelledError:
-            pass
+    # Отменяет задачи лидера вместе с keep_running, перезапуска polling не будет
+    await leader.stop()
+    await webhook.pool.drain()
+    await bot.session.close()
+    await writer.stop()
+    await analytics.close()
+    await read_engine.dispose()
     await engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
 
+# Внутри CORS, чтобы ответы 429/503 были читаемы фронтендом
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
-    CORSMiddleware,
+    SkipStaticMiddleware,
+    middleware=CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Сжимаем JSON от GZIP_MIN_SIZE байт; картинки и файлы фронтенда идут мимо
+app.add_middleware(
+    SkipStaticMiddleware,
+    middleware=GZipMiddleware,
+    minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1000")),
+    compresslevel=int(os.getenv("GZIP_LEVEL", "6")),
+)
+
 app.add_middleware(BannedUserMiddleware)
 
+if query_budget.ENABLED:
+    # QUERY_BUDGET > 0: лог N+1 и превышения бюджета SQL на запрос
+    query_budget.instrument_default_engines()
+    app.add_middleware(QueryBudgetMiddleware)
+
+# Добавлен последним — внешний слой: видит и 403 от бана, и время всего стека
+app.add_middleware(MetricsMiddleware)
+metrics.instrument_engine(engine, "write")
+metrics.instrument_engine(read_engine, "read")
+metrics.register_gauge(
+    "leader", "1 if this process runs the bot and background jobs", lambda: int(leader.is_leader)
+)
+
 # Serve uploads with no-cache headers to prevent image caching issues
 @app.get("/uploads/{filename:path}")
 async def serve_upload(filename: str):
@@ -152,19 +230,23 @@ async def root():
 @app.get("/users/{user_id}/orders/", response_model=List[OrderResponse])
 async def get_user_orders(
     user_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     user = await db.execute(select(DBUser).where(DBUser.id == user_id))
     if not user.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="User not found")
 
-    result = await db.execute(
-        select(Order)
-        .where(Order.user_id == user_id)
-        .options(selectinload(Order.items))
-        .order_by(Order.created_at.desc())
-    )
-    orders = result.scalars().all()
+    # История без периода: рабочие заказы и архив (по индексу user_id, created_at)
+    orders = []
+    for order_model, _ in await archive.order_sources(db):
+        result = await db.execute(
+            select(order_model)
+            .where(order_model.user_id == user_id)
+            .options(selectinload(order_model.items))
+            .order_by(order_model.created_at.desc())
+        )
+        orders.extend(result.scalars().all())
+    orders.sort(key=lambda o: o.created_at or datetime.min, reverse=True)
 
     response = []
     for order in orders:
@@ -267,7 +349,7 @@ async def register_user(
 @app.get("/users/{telegram_id}/loyalty")
 async def get_user_loyalty(
     telegram_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Get user loyalty information including stamps, level, and discount percentage"""
     try:
@@ -404,9 +486,15 @@ async def create_or_get_basket(
             }
         )
 
-    basket.total_price = total_price
-    await db.commit()
-    await db.refresh(basket)
+    if basket.total_price != total_price:
+        basket_id = basket.id
+
+        async def _save_total(session: AsyncSession):
+            await session.execute(
+                update(Basket).where(Basket.id == basket_id).values(total_price=total_price)
+            )
+
+        await writer.submit(_save_total)
 
     return {
         "user_id": user_id, 
@@ -423,22 +511,22 @@ async def add_to_basket(
     item_data: BasketItemCreate = Body(...),
     db: AsyncSession = Depends(get_db),
 ):
-    try:
-        user = await db.get(DBUser, user_id)
+    async def _add(session: AsyncSession):
+        user = await session.get(DBUser, user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Пользователь с ID {user_id} не найден",
             )
 
-        item = await db.get(Item, item_data.item_id)
+        item = await session.get(Item, item_data.item_id)
         if not item:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Товар с ID {item_data.item_id} не найден",
             )
 
-        basket = await db.scalar(
+        basket = await session.scalar(
             select(Basket)
             .where(Basket.user_id == user_id)
             .options(selectinload(Basket.items))
@@ -446,14 +534,9 @@ async def add_to_basket(
 
         if not basket:
             basket = Basket(user_id=user_id, total_price=0)
-            db.add(basket)
-            await db.commit()
-            await db.refresh(basket)
-            basket = await db.scalar(
-                select(Basket)
-                .where(Basket.user_id == user_id)
-                .options(selectinload(Basket.items))
-            )
+            session.add(basket)
+            await session.flush()
+            await session.refresh(basket, ["items"])
 
         existing_item = None
         for bi in basket.items:
@@ -474,13 +557,12 @@ async def add_to_basket(
                 price=item.price,
                 selected_taste=item_data.selected_taste,
             )
-            db.add(new_item)
+            session.add(new_item)
 
         basket.total_price = sum(item.quantity * item.price for item in basket.items)
 
-        await db.commit()
-        await db.refresh(basket)
-
+    try:
+        await writer.submit(_add)
         return await create_or_get_basket(user_id, db)
 
     except Exception as e:
@@ -497,32 +579,34 @@ async def remove_from_basket(
     item_id: int = Path(..., gt=0),
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(select(Basket).where(Basket.user_id == user_id))
-    basket = result.scalar_one_or_none()
+    async def _remove(session: AsyncSession):
+        result = await session.execute(select(Basket).where(Basket.user_id == user_id))
+        basket = result.scalar_one_or_none()
 
-    if not basket:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Basket not found"
+        if not basket:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Basket not found"
+            )
+
+        result = await session.execute(
+            select(BasketItem, Item)
+            .join(Item, BasketItem.item_id == Item.id)
+            .where(BasketItem.basket_id == basket.id)
+            .where(BasketItem.item_id == item_id)
         )
+        basket_item_with_item = result.first()
 
-    result = await db.execute(
-        select(BasketItem, Item)
-        .join(Item, BasketItem.item_id == Item.id)
-        .where(BasketItem.basket_id == basket.id)
-        .where(BasketItem.item_id == item_id)
-    )
-    basket_item_with_item = result.first()
+        if not basket_item_with_item:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Item not found in basket"
+            )
 
-    if not basket_item_with_item:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Item not found in basket"
-        )
+        basket_item, item = basket_item_with_item
+        basket.total_price -= item.price * basket_item.quantity
 
-    basket_item, item = basket_item_with_item
-    basket.total_price -= item.price * basket_item.quantity
+        await session.delete(basket_item)
 
-    await db.delete(basket_item)
-    await db.commit()
+    await writer.submit(_remove)
     return await create_or_get_basket(user_id, db)
 
 
@@ -540,33 +624,32 @@ async def update_basket_item_quantity(
                 detail="Количество должно быть больше 0",
             )
 
-        basket = await db.scalar(
-            select(Basket)
-            .where(Basket.user_id == user_id)
-            .options(selectinload(Basket.items))
-        )
-
-        if not basket:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Корзина не найдена",
+        async def _update(session: AsyncSession):
+            basket = await session.scalar(
+                select(Basket)
+                .where(Basket.user_id == user_id)
+                .options(selectinload(Basket.items))
             )
 
-        basket_item = await db.get(BasketItem, basket_item_id)
+            if not basket:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Корзина не найдена",
+                )
 
-        if not basket_item or basket_item.basket_id != basket.id:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Товар не найден в корзине",
-            )
+            basket_item = await session.get(BasketItem, basket_item_id)
 
-        basket_item.quantity = update_data.quantity
+            if not basket_item or basket_item.basket_id != basket.id:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Товар не найден в корзине",
+                )
 
-        basket.total_price = sum(item.quantity * item.price for item in basket.items)
+            basket_item.quantity = update_data.quantity
 
-        await db.commit()
-        await db.refresh(basket)
+            basket.total_price = sum(item.quantity * item.price for item in basket.items)
 
+        await writer.submit(_update)
         return await create_or_get_basket(user_id, db)
 
     except HTTPException:
@@ -579,47 +662,54 @@ async def update_basket_item_quantity(
         )
 
 
-@app.get("/items/")
+@app.get("/items/", response_class=ORJSONResponse)
 async def read_items(
-    db: AsyncSession = Depends(get_db),
+    sort: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    result = await db.execute(
-        select(Item).options(
-            selectinload(Item.category),
-            selectinload(Item.tastes),
-        )
+    """Каталог товаров. sort=popular — сначала самые продаваемые (по popularity_score)"""
+    stmt = select(Item).options(
+        selectinload(Item.category),
+        selectinload(Item.tastes),
     )
+    if sort == "popular":
+        stmt = stmt.order_by(Item.popularity_score.desc(), Item.id)
+    result = await db.execute(stmt)
     items = result.scalars().all()
 
-    return {
-        "items": [
-            {
-                "id": item.id,
-                "name": item.name,
-                "description": item.description,
-                "image": item.image,
-                "price": item.price,
-                "category": {"id": item.category.id, "name": item.category.name}
-                if item.category
-                else None,
-                "tastes": [
-                    {
-                        "id": taste.id,
-                        "name": taste.name,
-                        "image": taste.image,
-                    }
-                    for taste in item.tastes
-                ]
-                if item.tastes
-                else None,
-                "strength": item.strength,
-                "puffs": item.puffs,
-                "vg_pg": item.vg_pg,
-                "tank_volume": item.tank_volume,
-            }
-            for item in items
-        ]
-    }
+    # Готовый ORJSONResponse минует jsonable_encoder: в ответе только простые типы
+    return ORJSONResponse(
+        {
+            "items": [
+                {
+                    "id": item.id,
+                    "name": item.name,
+                    "description": item.description,
+                    "image": item.image,
+                    "price": item.price,
+                    "category": {"id": item.category.id, "name": item.category.name}
+                    if item.category
+                    else None,
+                    "tastes": [
+                        {
+                            "id": taste.id,
+                            "name": taste.name,
+                            "image": taste.image,
+                        }
+                        for taste in item.tastes
+                    ]
+                    if item.tastes
+                    else None,
+                    "strength": item.strength,
+                    "puffs": item.puffs,
+                    "vg_pg": item.vg_pg,
+                    "tank_volume": item.tank_volume,
+                    "popularity_score": item.popularity_score or 0,
+                }
+                for item in items
+            ]
+        }
+    )
 
 
 @app.patch("/orders/{order_id}/status")
@@ -642,7 +732,9 @@ async def update_order_status(
     ]:
         raise HTTPException(status_code=400, detail="Некорректный статус")
 
+    old_status = order.status
     order.status = new_status
+    await record_status_change(db, order, old_status, new_status, actor="api")
     await db.commit()
 
     # Отправляем уведомление пользователю
@@ -826,12 +918,20 @@ async def notify_couriers_about_new_order(order: Order, db: AsyncSession):
         # Отправляем каждому получателю
         for recipient_id in recipients:
             try:
-                await bot.send_message(
+                sent_message = await bot.send_message(
                     chat_id=recipient_id,
                     text=order_info,
                     parse_mode="MarkdownV2",
                     reply_markup=get_courier_keyboard(order.id, "waiting_for_courier"),
                 )
+                await writer.submit(
+                    order_messages.remember(
+                        order.id,
+                        recipient_id,
+                        sent_message.message_id,
+                        order_messages.NEW_ORDER,
+                    )
+                )
             except Exception as e:
                 logger.error(
                     f"Ошибка при отправке уведомления о заказе {order.id} пользователю {recipient_id}: {e}"
@@ -924,27 +1024,29 @@ async def create_order_from_basket(
         # 4. Переносим товары из корзины в заказ с сохранением вкусов
         total_price = 0
         order_items = []
+        order_item_rows = []
 
         for basket_item in basket.items:
-            # Получаем полную информацию о товаре
-            item = await db.get(Item, basket_item.item_id)
+            # Товар со вкусами загружен вместе с корзиной (selectinload), без запроса на строку
+            item = basket_item.item
             if not item:
                 continue  # Пропускаем если товар не найден
 
             # Рассчитываем стоимость позиции
             item_total = basket_item.price * basket_item.quantity
 
-            # Создаем запись о товаре в заказе
-            order_item = OrderItem(
-                order_id=order.id,
-                item_id=item.id,
-                name=item.name,
-                quantity=basket_item.quantity,
-                price_per_item=basket_item.price,
-                total_price=item_total,
-                selected_taste=basket_item.selected_taste,  # Сохраняем выбранный вкус
+            # Запись о товаре в заказе; все позиции вставляются одним executemany ниже
+            order_item_rows.append(
+                {
+                    "order_id": order.id,
+                    "item_id": item.id,
+                    "name": item.name,
+                    "quantity": basket_item.quantity,
+                    "price_per_item": basket_item.price,
+                    "total_price": item_total,
+                    "selected_taste": basket_item.selected_taste,  # Сохраняем выбранный вкус
+                }
             )
-            db.add(order_item)
 
             # Формируем информацию о товаре для ответа
             order_items.append(
@@ -963,6 +1065,9 @@ async def create_order_from_basket(
 
             total_price += item_total
 
+        if order_item_rows:
+            await db.execute(insert(OrderItem), order_item_rows)
+
         # 5. Применяем промокод если указан
         if order_data.promocode:
             promo = await db.scalar(
@@ -977,6 +1082,9 @@ async def create_order_from_basket(
         # 6. Добавляем стоимость доставки и обновляем итоговую стоимость заказа
         total_price += order.delivery_cost
         order.total_price = total_price
+        await record_status_change(
+            db, order, None, order.status, actor=f"tg:{x_user_id}"
+        )
         await db.commit()
 
         # 7. Отправляем уведомление пользователю
@@ -1098,7 +1206,7 @@ async def create_promocode(
 
 
 @app.get("/get_promo")
-async def read_promocodes(db: AsyncSession = Depends(get_db)):
+async def read_promocodes(db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(Promocode))
     promocodes = result.scalars().all()
 
@@ -1331,6 +1439,7 @@ async def del_item(item_id: int, db: AsyncSession = Depends(get_db)):
     if not item:
         raise HTTPException(status_code=404, detail="Not found")
     try:
+        await catalog.detach_item(db, item_id)
         await db.delete(item)
         await db.commit()
         return {
@@ -1428,87 +1537,38 @@ async def del_category(category_id: int, db: AsyncSession = Depends(get_db)):
         )
 
 
-@app.get("/categories/")
-async def read_categories(db: AsyncSession = Depends(get_db)):
+@app.get("/categories/", response_class=ORJSONResponse)
+async def read_categories(db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(Category).options(selectinload(Category.items)))
     categories = result.scalars().all()
 
-    return {
-        "categories": [
-            {
-                "id": category.id,
-                "name": category.name,
-                "image": category.image,
-                "items": [
-                    {"id": item.id, "name": item.name, "price": item.price}
-                    for item in category.items
-                ],
-            }
-            for category in categories
-        ]
-    }
+    return ORJSONResponse(
+        {
+            "categories": [
+                {
+                    "id": category.id,
+                    "name": category.name,
+                    "image": category.image,
+                    "items": [
+                        {"id": item.id, "name": item.name, "price": item.price}
+                        for item in category.items
+                    ],
+                }
+                for category in categories
+            ]
+        }
+    )
 
 
 @app.get("/users/")
-async def read_users(db: AsyncSession = Depends(get_db)):
+async def read_users(db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(DBUser))
     users = result.scalars().all()
     return {"users": [{"id": user.id} for user in users]}
 
 
 # ========================= Analytics helpers & endpoints =========================
-
-
-def _period_bounds(
-    period: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None
-) -> tuple[datetime, datetime]:
-    """Возвращает (start_dt, end_dt) в UTC по заданному периоду или явным датам.
-
-    period: today | yesterday | week | month
-    start, end: строки вида YYYY-MM-DD (включительно)
-    """
-    now = datetime.utcnow()
-
-    # Нормализуем на начало суток
-    def day_start(dt: datetime) -> datetime:
-        return datetime(dt.year, dt.month, dt.day)
-
-    if start and end:
-        try:
-            start_parts = [int(x) for x in start.split("-")]
-            end_parts = [int(x) for x in end.split("-")]
-            start_dt = datetime(start_parts[0], start_parts[1], start_parts[2])
-            # конец дня включительно → +1 день не включая границу
-            end_dt = datetime(end_parts[0], end_parts[1], end_parts[2]) + timedelta(
-                days=1
-            )
-            return start_dt, end_dt
-        except Exception:
-            # Если формат неверный, по умолчанию сегодня
-            s = day_start(now)
-            return s, s + timedelta(days=1)
-
-    p = (period or "today").lower()
-    if p == "today":
-        s = day_start(now)
-        e = s + timedelta(days=1)
-    elif p == "yesterday":
-        e = day_start(now)
-        s = e - timedelta(days=1)
-    elif p == "week":
-        e = day_start(now) + timedelta(days=1)
-        s = e - timedelta(days=7)
-    elif p == "month":
-        s = datetime(now.year, now.month, 1)
-        # следующий месяц
-        if now.month == 12:
-            e = datetime(now.year + 1, 1, 1)
-        else:
-            e = datetime(now.year, now.month + 1, 1)
-    else:
-        s = day_start(now)
-        e = s + timedelta(days=1)
-    return s, e
+# Сами отчеты живут в services.analytics: бот вызывает их в процессе, без HTTP.
 
 
 @app.get("/analytics/turnover")
@@ -1516,211 +1576,190 @@ async def analytics_turnover(
     period: Optional[str] = None,
     start: Optional[str] = None,
     end: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Возвращает оборот за период. По умолчанию: сегодня.
     Параметры:
       - period: today|yesterday|week|month
       - start, end: YYYY-MM-DD (если указаны, period игнорируется)
     Считаем только заказы со статусом delivered|completed.
+    Читаем из агрегата daily_sales: не больше 31 строки на месяц по каждому статусу.
     """
-    start_dt, end_dt = _period_bounds(period, start, end)
-
-    q = (
-        select(func.coalesce(func.sum(Order.total_price), 0.0), func.count(Order.id))
-        .where(Order.created_at >= start_dt)
-        .where(Order.created_at < end_dt)
-        .where(Order.status.in_(["delivered", "completed"]))
-    )
-    res = await db.execute(q)
-    total, orders_count = res.first()
-    return {
-        "period": {"start": start_dt, "end": end_dt},
-        "turnover": float(total or 0),
-        "orders_count": int(orders_count or 0),
-        "currency": "RUB",
-    }
+    start_dt, end_dt = analytics.period_bounds(period, start, end)
+    return await analytics.turnover(db, start_dt, end_dt)
 
 
-@app.get("/analytics/sales", response_model=SalesResponse)
+@app.get(
+    "/analytics/sales", response_model=SalesResponse, response_class=ORJSONResponse
+)
 async def analytics_sales(
     period: Optional[str] = None,
     start: Optional[str] = None,
     end: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Список продаж (заказы и позиции) за период. По умолчанию: сегодня.
     Считаем только заказы со статусом delivered|completed.
     """
-    start_dt, end_dt = _period_bounds(period, start, end)
-
-    orders_stmt = (
-        select(Order)
-        .where(Order.created_at >= start_dt)
-        .where(Order.created_at < end_dt)
-        .where(Order.status.in_(["delivered", "completed"]))
-        .options(selectinload(Order.items))
-        .order_by(Order.created_at.desc())
-    )
-    result = await db.execute(orders_stmt)
-    orders = result.scalars().all()
-
-    sales_payload: List[Sale] = []
-    cumulative_total = 0.0
-    for o in orders:
-        items_stmt = select(OrderItem).where(OrderItem.order_id == o.id)
-        items_res = await db.execute(items_stmt)
-        order_items = items_res.scalars().all()
-        items_payload: List[SalesItem] = []
-        for it in order_items:
-            items_payload.append(
-                SalesItem(
-                    name=it.name,
-                    quantity=it.quantity,
-                    selected_taste=it.selected_taste,
-                    price_per_item=float(it.price_per_item),
-                    total_price=float(it.total_price),
-                )
-            )
-        cumulative_total += float(o.total_price or 0)
-        sales_payload.append(
-            Sale(
-                id=o.id,
-                created_at=o.created_at,
-                user_id=o.user_id,
-                username=o.username,
-                status=o.status,
-                total_price=float(o.total_price or 0),
-                items=items_payload,
-            )
-        )
+    start_dt, end_dt = analytics.period_bounds(period, start, end)
+    return await analytics.sales(db, start_dt, end_dt, analytics.PAID_STATUSES)
 
-    return SalesResponse(
-        period={"start": start_dt, "end": end_dt},
-        turnover=float(cumulative_total),
-        orders_count=len(sales_payload),
-        sales=sales_payload,
-    )
 
-
-@app.get("/analytics/canceled_orders", response_model=SalesResponse)
+@app.get(
+    "/analytics/canceled_orders", response_model=SalesResponse, response_class=ORJSONResponse
+)
 async def analytics_canceled_orders(
     period: Optional[str] = None,
     start: Optional[str] = None,
     end: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Эндпоинт для получения отмененных заказов за период"""
-    start_dt, end_dt = _period_bounds(period, start, end)
-
-    orders_stmt = (
-        select(Order)
-        .where(Order.created_at >= start_dt)
-        .where(Order.created_at < end_dt)
-        .where(Order.status == "canceled")
-        .options(selectinload(Order.items))
-        .order_by(Order.created_at.desc())
-    )
-    result = await db.execute(orders_stmt)
-    orders = result.scalars().all()
-
-    sales_payload: List[Sale] = []
-    cumulative_total = 0.0
-    for o in orders:
-        items_stmt = select(OrderItem).where(OrderItem.order_id == o.id)
-        items_res = await db.execute(items_stmt)
-        order_items = items_res.scalars().all()
-        items_payload: List[SalesItem] = []
-        for it in order_items:
-            items_payload.append(
-                SalesItem(
-                    name=it.name,
-                    quantity=it.quantity,
-                    selected_taste=it.selected_taste,
-                    price_per_item=float(it.price_per_item),
-                    total_price=float(it.total_price),
-                )
-            )
-        cumulative_total += float(o.total_price or 0)
-        sales_payload.append(
-            Sale(
-                id=o.id,
-                created_at=o.created_at,
-                user_id=o.user_id,
-                username=o.username,
-                status=o.status,
-                total_price=float(o.total_price or 0),
-                items=items_payload,
-            )
-        )
-
-    return SalesResponse(
-        period={"start": start_dt, "end": end_dt},
-        turnover=float(cumulative_total),
-        orders_count=len(sales_payload),
-        sales=sales_payload,
-    )
+    start_dt, end_dt = analytics.period_bounds(period, start, end)
+    return await analytics.sales(db, start_dt, end_dt, ["canceled"])
 
 
-@app.get("/analytics/completed_orders", response_model=SalesResponse)
+@app.get(
+    "/analytics/completed_orders", response_model=SalesResponse, response_class=ORJSONResponse
+)
 async def analytics_completed_orders(
     period: Optional[str] = None,
     start: Optional[str] = None,
     end: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Эндпоинт для получения завершенных заказов за период"""
-    start_dt, end_dt = _period_bounds(period, start, end)
-
-    orders_stmt = (
-        select(Order)
-        .where(Order.created_at >= start_dt)
-        .where(Order.created_at < end_dt)
-        .where(Order.status == "completed")
-        .options(selectinload(Order.items))
-        .order_by(Order.created_at.desc())
-    )
-    result = await db.execute(orders_stmt)
-    orders = result.scalars().all()
-
-    sales_payload: List[Sale] = []
-    cumulative_total = 0.0
-    for o in orders:
-        items_stmt = select(OrderItem).where(OrderItem.order_id == o.id)
-        items_res = await db.execute(items_stmt)
-        order_items = items_res.scalars().all()
-        items_payload: List[SalesItem] = []
-        for it in order_items:
-            items_payload.append(
-                SalesItem(
-                    name=it.name,
-                    quantity=it.quantity,
-                    selected_taste=it.selected_taste,
-                    price_per_item=float(it.price_per_item),
-                    total_price=float(it.total_price),
-                )
-            )
-        cumulative_total += float(o.total_price or 0)
-        sales_payload.append(
-            Sale(
-                id=o.id,
-                created_at=o.created_at,
-                user_id=o.user_id,
-                username=o.username,
-                status=o.status,
-                total_price=float(o.total_price or 0),
-                items=items_payload,
-            )
+    start_dt, end_dt = analytics.period_bounds(period, start, end)
+    return await analytics.sales(db, start_dt, end_dt, ["completed"])
+
+
+@app.get("/analytics/top_items")
+async def analytics_top_items(
+    period: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 10,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Топ товаров по проданным штукам за период.
+    status: список статусов через запятую (по умолчанию delivered,completed)
+    """
+    start_dt, end_dt = analytics.period_bounds(period, start, end)
+    return await analytics.top_items(db, start_dt, end_dt, status, limit)
+
+
+@app.get("/analytics/top_tastes")
+async def analytics_top_tastes(
+    period: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 10,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Топ вкусов по проданным штукам за период (позиции без вкуса не учитываются)"""
+    start_dt, end_dt = analytics.period_bounds(period, start, end)
+    return await analytics.top_tastes(db, start_dt, end_dt, status, limit)
+
+
+async def _delivery_latency(
+    metric: str,
+    group_by: str,
+    period: Optional[str],
+    start: Optional[str],
+    end: Optional[str],
+    db: AsyncSession,
+):
+    if group_by not in analytics.LATENCY_GROUPS:
+        raise HTTPException(
+            status_code=400, detail="group_by должен быть courier, delivery или hour"
         )
+    start_dt, end_dt = analytics.period_bounds(period, start, end)
+    return await analytics.delivery_latency(db, start_dt, end_dt, metric, group_by)
+
 
-    return SalesResponse(
-        period={"start": start_dt, "end": end_dt},
-        turnover=float(cumulative_total),
-        orders_count=len(sales_payload),
-        sales=sales_payload,
+@app.get("/analytics/time_to_claim")
+async def analytics_time_to_claim(
+    group_by: str = "courier",
+    period: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """p50/p90/p99 времени от появления заказа до взятия курьером (в секундах).
+    group_by: courier|delivery|hour (час, когда заказ начал ждать курьера)
+    """
+    return await _delivery_latency("claim", group_by, period, start, end, db)
+
+
+@app.get("/analytics/time_to_deliver")
+async def analytics_time_to_deliver(
+    group_by: str = "courier",
+    period: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """p50/p90/p99 времени от взятия заказа курьером до доставки (в секундах).
+    group_by: courier|delivery|hour (час, когда курьер взял заказ)
+    """
+    return await _delivery_latency("deliver", group_by, period, start, end, db)
+
+
+@app.get("/analytics/export")
+async def analytics_export(
+    format: str = "csv",
+    period: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Выгрузка заказов и их позиций за период в CSV или NDJSON (по строке на позицию).
+    Параметры:
+      - format: csv|ndjson
+      - period / start, end: как в остальных отчетах
+      - status: статус заказа или несколько через запятую, как в top_items (по умолчанию все)
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format должен быть csv или ndjson")
+
+    start_dt, end_dt = analytics.period_bounds(period, start, end)
+    sources = await archive.order_sources(db, start_dt)
+    stmt = analytics.export_statement(start_dt, end_dt, status, sources)
+
+    filename = analytics.export_filename(start_dt, end_dt, format)
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        analytics.export_rows(stmt, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
+@app.post("/telegram/webhook/{secret}", include_in_schema=False)
+async def telegram_webhook(
+    secret: str,
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None),
+):
+    """Апдейты бота в режиме BOT_MODE=webhook"""
+    if not webhook.webhook_enabled() or not webhook.check_secret(
+        secret, x_telegram_bot_api_secret_token
+    ):
+        raise HTTPException(status_code=404, detail="Not found")
+    update = Update.model_validate(await request.json(), context={"bot": bot})
+    await webhook.pool.submit(dp, bot, update)
+    return Response()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Метрики процесса в формате Prometheus"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/{full_path:path}")
 async def spa_fallback(full_path: str):
     # Не перехватывать static files
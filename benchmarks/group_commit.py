@@ -0,0 +1,94 @@
+"""Мелкие конкурентные записи: отдельная транзакция на запрос против WriteCoordinator.
+
+python -m benchmarks.group_commit [--workers 50] [--writes 40] [--url postgresql+asyncpg://...]
+Без --url каждый режим пишет во временный файл SQLite; с --url таблицы в базе пересоздаются.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.sqlite_profile import percentile_ms
+from database.db import apply_sqlite_pragmas, engine_options
+from database.models import Base, DBUser
+from database.writer import WriteCoordinator
+
+USERS = 100
+
+
+def _bump(user_id: int):
+    async def op(session):
+        await session.execute(
+            update(DBUser).where(DBUser.id == user_id).values(point=DBUser.point + 1)
+        )
+
+    return op
+
+
+async def run(mode: str, workers: int, writes: int, url: str = None) -> dict:
+    if url is None:
+        url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), f'{mode}.db')}"
+    engine = create_async_engine(url, **engine_options(url, pool_size=5))
+    apply_sqlite_pragmas(engine)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as session:
+        session.add_all(DBUser(id=i, username=f"user{i}", point=0) for i in range(1, USERS + 1))
+        await session.commit()
+
+    coordinator = WriteCoordinator(engine)
+    if mode == "group":
+        await coordinator.start()
+
+    async def direct(op):
+        async with session_factory() as session:
+            await op(session)
+            await session.commit()
+
+    submit = coordinator.submit if mode == "group" else direct
+    latencies = []
+
+    async def worker(n: int):
+        for i in range(writes):
+            started = time.perf_counter()
+            await submit(_bump((n * writes + i) % USERS + 1))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(workers)))
+    elapsed = time.perf_counter() - started
+    await coordinator.stop()
+    await engine.dispose()
+    return {
+        "mode": mode,
+        "writes_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--writes", type=int, default=40)
+    parser.add_argument("--url", help="тестовая база, например postgresql+asyncpg://...")
+    args = parser.parse_args()
+
+    for mode in ("direct", "group"):
+        result = await run(mode, args.workers, args.writes, args.url)
+        print(
+            f"{result['mode']:>6}: {result['writes_per_sec']:8.1f} writes/s | "
+            f"p50/p99/max {result['p50_ms']:.1f}/{result['p99_ms']:.1f}/{result['max_ms']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
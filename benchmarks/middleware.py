@@ -0,0 +1,113 @@
+"""Накладные расходы middleware на запрос: полный стек приложения против голого роутера.
+
+python -m benchmarks.middleware [--requests 2000]
+Запросы идут прямо в ASGI-приложение (без сети), база — временный файл SQLite.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("START_BOT", "false")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+)
+
+from app.main import app  # noqa: E402
+from database.db import AsyncSessionLocal, engine  # noqa: E402
+from database.models import Base, Category, DBUser, Item  # noqa: E402
+from middlewares.ban import ban_cache  # noqa: E402
+
+UPLOAD_NAME = "_benchmark_middleware.txt"
+HEADERS = [
+    (b"host", b"localhost"),
+    (b"origin", b"https://example.com"),
+    (b"x-user-id", b"1"),
+    (b"sec-fetch-mode", b"cors"),
+]
+
+
+async def _seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        session.add(DBUser(id=1, username="bench"))
+        session.add(Category(id=1, name="bench"))
+        session.add_all(
+            Item(id=i, name=f"item{i}", price=10, category_id=1, image="/uploads/x.png")
+            for i in range(1, 21)
+        )
+        await session.commit()
+    await ban_cache.preload()
+
+
+async def _request(asgi_app, path: str) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": HEADERS,
+        "client": ("127.0.0.1", 5000),
+        "server": ("localhost", 80),
+        "app": app,
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await asgi_app(scope, receive, send)
+    return status
+
+
+async def run(asgi_app, path: str, requests: int) -> float:
+    assert await _request(asgi_app, path) == 200, path
+    # Прогрев: кэши компиляции SQL, пул соединений, mmap SQLite
+    for _ in range(max(requests // 10, 1)):
+        await _request(asgi_app, path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await _request(asgi_app, path)
+    return requests / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    await _seed()
+    os.makedirs("uploads", exist_ok=True)
+    upload_path = os.path.join("uploads", UPLOAD_NAME)
+    with open(upload_path, "w") as f:
+        f.write("benchmark")
+
+    stack = app.build_middleware_stack()
+    try:
+        for path in ("/items/", f"/uploads/{UPLOAD_NAME}"):
+            bare = await run(app.router, path, args.requests)
+            full = await run(stack, path, args.requests)
+            overhead_us = (1 / full - 1 / bare) * 1_000_000
+            print(
+                f"{path:<40} router {bare:8.1f} req/s | stack {full:8.1f} req/s | "
+                f"+{overhead_us:.0f} µs/req"
+            )
+    finally:
+        os.remove(upload_path)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
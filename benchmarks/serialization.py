@@ -0,0 +1,76 @@
+"""Сериализация каталога: JSONResponse (jsonable_encoder + json) против ORJSONResponse, и сжатие.
+
+python -m benchmarks.serialization [--items 500] [--tastes 40] [--repeat 50]
+Тело — как у /items/: товары с категорией и списком вкусов. Размер на проводе
+считается для сырого JSON и для gzip с уровнями, которые можно задать в GZIP_LEVEL.
+"""
+import argparse
+import gzip
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+
+def catalog(items: int, tastes: int) -> dict:
+    return {
+        "items": [
+            {
+                "id": i,
+                "name": f"Одноразка {i}",
+                "description": "Описание товара, пара предложений о вкусе и устройстве. " * 3,
+                "image": f"/uploads/item_{i}.png",
+                "price": 1290 + i,
+                "category": {"id": i % 12, "name": f"Категория {i % 12}"},
+                "tastes": [
+                    {"id": t, "name": f"Вкус {t}", "image": f"/uploads/taste_{t}.png"}
+                    for t in range(tastes)
+                ],
+                "strength": "20 мг",
+                "puffs": 6000,
+                "vg_pg": "50/50",
+                "tank_volume": 12.0,
+                "popularity_score": i * 0.5,
+            }
+            for i in range(items)
+        ]
+    }
+
+
+def _time_ms(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--tastes", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    payload = catalog(args.items, args.tastes)
+    encoders = {
+        # Путь FastAPI для dict без response_model
+        "jsonable_encoder+json": lambda: JSONResponse(jsonable_encoder(payload)).body,
+        "orjson": lambda: ORJSONResponse(payload).body,
+    }
+    for name, encode in encoders.items():
+        print(f"{name:<24} {_time_ms(encode, args.repeat):8.2f} ms")
+
+    body = encoders["orjson"]()
+    print(f"\n{'raw':<24} {len(body) / 1024:10.1f} KiB")
+    for level in (1, 6, 9):
+        compressed = gzip.compress(body, compresslevel=level)
+        elapsed = _time_ms(lambda: gzip.compress(body, compresslevel=level), args.repeat)
+        print(
+            f"{f'gzip {level}':<24} {len(compressed) / 1024:10.1f} KiB "
+            f"({len(compressed) / len(body):.1%}) {elapsed:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Смешанная нагрузка чтение/запись на SQLite: без профиля и с профилем из database.db.
+
+python -m benchmarks.sqlite_profile [--workers 20] [--seconds 5] [--write-ratio 0.2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.db import apply_sqlite_pragmas, sqlite_pragmas
+from database.models import Base, Basket, BasketItem, DBUser, Item
+
+USERS = 500
+ITEMS = 200
+
+
+async def _seed(session_factory):
+    async with session_factory() as session:
+        session.add_all(DBUser(id=i, username=f"user{i}") for i in range(1, USERS + 1))
+        session.add_all(Item(id=i, name=f"item{i}", price=10) for i in range(1, ITEMS + 1))
+        session.add_all(Basket(id=i, user_id=i) for i in range(1, USERS + 1))
+        await session.commit()
+
+
+async def _read(session_factory, rnd):
+    async with session_factory() as session:
+        basket_id = rnd.randint(1, USERS)
+        await session.execute(
+            select(BasketItem, Item)
+            .join(Item, Item.id == BasketItem.item_id)
+            .where(BasketItem.basket_id == basket_id)
+        )
+
+
+async def _write(session_factory, rnd):
+    async with session_factory() as session:
+        basket_id = rnd.randint(1, USERS)
+        session.add(
+            BasketItem(basket_id=basket_id, item_id=rnd.randint(1, ITEMS), price=10)
+        )
+        await session.execute(
+            update(Basket)
+            .where(Basket.id == basket_id)
+            .values(total_price=Basket.total_price + 10)
+        )
+        await session.commit()
+
+
+def percentile_ms(values: list, p: int) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, len(ordered) * p // 100)] * 1000
+
+
+async def run(profile: str, workers: int, seconds: float, write_ratio: float) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), f"{profile}.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    if profile == "tuned":
+        apply_sqlite_pragmas(engine, sqlite_pragmas)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await _seed(session_factory)
+
+    latencies = {"read": [], "write": []}
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(n: int):
+        nonlocal errors
+        rnd = random.Random(n)
+        while time.perf_counter() < deadline:
+            kind = "write" if rnd.random() < write_ratio else "read"
+            started = time.perf_counter()
+            try:
+                await (_write if kind == "write" else _read)(session_factory, rnd)
+            except OperationalError:
+                errors += 1
+                continue
+            latencies[kind].append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker(n) for n in range(workers)))
+    await engine.dispose()
+
+    total = len(latencies["read"]) + len(latencies["write"])
+    return {
+        "profile": profile,
+        "ops_per_sec": total / seconds,
+        "writes_per_sec": len(latencies["write"]) / seconds,
+        "read_p50_ms": percentile_ms(latencies["read"], 50),
+        "read_p99_ms": percentile_ms(latencies["read"], 99),
+        "write_p50_ms": percentile_ms(latencies["write"], 50),
+        "write_p99_ms": percentile_ms(latencies["write"], 99),
+        "locked_errors": errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    for profile in ("default", "tuned"):
+        result = await run(profile, args.workers, args.seconds, args.write_ratio)
+        print(
+            f"{result['profile']:>8}: {result['ops_per_sec']:8.1f} ops/s "
+            f"({result['writes_per_sec']:.1f} writes/s) | "
+            f"read p50/p99 {result['read_p50_ms']:.1f}/{result['read_p99_ms']:.1f} ms | "
+            f"write p50/p99 {result['write_p50_ms']:.1f}/{result['write_p99_ms']:.1f} ms | "
+            f"locked: {result['locked_errors']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
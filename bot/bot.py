@@ -5,12 +5,14 @@ from asyncio.log import logger
 from datetime import datetime
 from typing import List
 
-import aiohttp
 from aiogram import Bot, Dispatcher, F, types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import Command
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import (
+    BufferedInputFile,
     CallbackQuery,
     FSInputFile,
     InlineKeyboardButton,
@@ -24,10 +26,16 @@ from aiogram.types import (
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from dotenv import load_dotenv
 from fastapi import HTTPException, UploadFile
-from sqlalchemy import delete, func, insert, select
+from sqlalchemy import and_, delete, exists, func, insert, or_, select, update
 from sqlalchemy.orm import joinedload, selectinload
 
-from database.db import AsyncSessionLocal
+from bot import pagination
+from bot.fsm_storage import create_storage
+from bot.metrics import TelegramRequestMetrics, UpdateMetricsMiddleware
+from bot.query_budget import QueryBudgetUpdateMiddleware
+from bot.rate_limit import limiter as telegram_limiter
+from database import query_budget
+from database.db import AsyncSessionLocal, ReadSessionLocal
 from database.models import (
     Category,
     Courier,
@@ -39,6 +47,10 @@ from database.models import (
     Taste,
     item_taste_association,
 )
+from database.writer import writer
+from middlewares.ban import ban_cache
+from services import analytics, catalog, order_messages, telegram_files, users
+from services.order_status import record_status_change
 
 if not load_dotenv("./config/.env.local"):
     raise Exception("Failed to load .env file")
@@ -52,6 +64,10 @@ logger = logging.getLogger(__name__)
 
 # Конфигурация
 IMAGES_DIR = "uploads"
+# Сколько раз повторять отправку карточки заказа после RetryAfter от Telegram
+CARD_SEND_ATTEMPTS = int(os.getenv("CARD_SEND_ATTEMPTS", "5"))
+# Карточек новых заказов за один показ; 0 — сколько лимитер пропускает в чат без пауз
+NEW_ORDERS_PAGE_SIZE = int(os.getenv("NEW_ORDERS_PAGE_SIZE", "0"))
 
 # Получаем переменные окружения с безопасными значениями по умолчанию
 TOKEN = os.getenv("TOKEN", "")
@@ -68,7 +84,13 @@ def check_required_env():
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
 bot = Bot(token=str(os.getenv("TOKEN")))
-dp = Dispatcher()
+bot.session.middleware(TelegramRequestMetrics())
+# Состояния FSM в БД: переживают рестарт и общие для нескольких процессов
+dp = Dispatcher(storage=create_storage())
+dp.update.outer_middleware(UpdateMetricsMiddleware())
+if query_budget.ENABLED:
+    query_budget.instrument_default_engines()
+    dp.update.outer_middleware(QueryBudgetUpdateMiddleware())
 
 
 class ItemStates(StatesGroup):
@@ -191,15 +213,6 @@ def get_courier_keyboard(order_id: int, status: str):
     return builder.as_markup()
 
 
-async def delete_bot_messages(chat_id: int, message_ids: list):
-    """Удаляет сообщения бота по их ID"""
-    for message_id in message_ids:
-        try:
-            await bot.delete_message(chat_id=chat_id, message_id=message_id)
-        except Exception as e:
-            logger.error(f"Ошибка при удалении сообщения {message_id}: {e}")
-
-
 def format_order_info(order: Order, orders_count: int, username: str = None) -> str:
     """Форматирование информации о заказе"""
 
@@ -282,6 +295,73 @@ def format_order_info(order: Order, orders_count: int, username: str = None) ->
     )
 
 
+async def orders_counts(db, user_ids) -> dict[int, int]:
+    """Число заказов по каждому клиенту одним GROUP BY (для статуса клиента в карточках)"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return {}
+    rows = await db.execute(
+        select(Order.user_id, func.count(Order.id))
+        .where(Order.user_id.in_(user_ids))
+        .group_by(Order.user_id)
+    )
+    return dict(rows.all())
+
+
+async def refresh_order_cards(
+    order_id: int,
+    order_info: str,
+    status: str,
+    actor_message: Message = None,
+) -> bool:
+    """Перерисовывает все отслеживаемые копии карточки заказа после смены статуса.
+
+    Текст рендерится вызывающим один раз; кнопки получают тот, кто сменил
+    статус, и админы, у остальных курьеров карточка остается без кнопок.
+    Возвращает True, если карточку actor_message удалось обновить.
+    """
+    async with ReadSessionLocal() as db:
+        cards = await order_messages.messages_for(
+            db, order_id, kinds=order_messages.CARD_KINDS
+        )
+    actor_card = None
+    if actor_message is not None:
+        actor_card = (actor_message.chat.id, actor_message.message_id)
+        if actor_card not in cards:
+            cards.append(actor_card)
+
+    keyboard = get_courier_keyboard(order_id, status)
+
+    async def edit(chat_id: int, message_id: int) -> bool:
+        is_actor = actor_card is not None and chat_id == actor_card[0]
+        for _ in range(2):
+            await telegram_limiter.wait(chat_id)
+            try:
+                await bot.edit_message_text(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    text=order_info,
+                    parse_mode="MarkdownV2",
+                    reply_markup=keyboard if is_actor or chat_id in ADMINS else None,
+                )
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                # Повторное нажатие: карточка уже в нужном виде
+                if "message is not modified" in str(e):
+                    return True
+                logger.warning(f"Карточка {message_id} в чате {chat_id} не обновлена: {e}")
+                return False
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении карточки {message_id} в чате {chat_id}: {e}")
+                return False
+        return False
+
+    results = await asyncio.gather(*(edit(chat_id, message_id) for chat_id, message_id in cards))
+    return actor_card is not None and results[cards.index(actor_card)]
+
+
 async def notify_user(order_id: int, message: str):
     """Отправляет уведомление пользователю о статусе заказа"""
     async with AsyncSessionLocal() as db:
@@ -329,6 +409,17 @@ async def ban_user_start(message: Message, state: FSMContext):
     await message.answer("Введите юзернейм пользователя (без @):")
 
 
+def _set_banned(user_id: int, is_banned: bool):
+    """Операция для writer: смена флага бана"""
+
+    async def op(session):
+        await session.execute(
+            update(DBUser).where(DBUser.id == user_id).values(is_banned=is_banned)
+        )
+
+    return op
+
+
 @dp.message(BanUserStates.waiting_for_username)
 async def process_username_for_ban(message: Message, state: FSMContext):
     """Обработка юзернейма для бана"""
@@ -363,24 +454,21 @@ async def process_ban_user(message: Message, state: FSMContext):
     user_id = data["user_id"]
     username = data["username"]
 
-    async with AsyncSessionLocal() as session:
-        # Обновляем статус пользователя
-        user = await session.get(DBUser, user_id)
-        user.is_banned = True
-        await session.commit()
-
-        # Отправляем уведомление пользователю (если возможно)
-        try:
-            await bot.send_message(
-                chat_id=user_id,
-                text=f"⛔ Вы были добавлены в черный список!\nПричина: {reason}",
-            )
-        except Exception as e:
-            logger.error(f"Не удалось уведомить пользователя @{username}: {e}")
+    await writer.submit(_set_banned(user_id, True))
+    ban_cache.invalidate(user_id, True)
 
-        await message.answer(
-            f"✅ Пользователь @{username} добавлен в черный список\nПричина: {reason}"
+    # Отправляем уведомление пользователю (если возможно)
+    try:
+        await bot.send_message(
+            chat_id=user_id,
+            text=f"⛔ Вы были добавлены в черный список!\nПричина: {reason}",
         )
+    except Exception as e:
+        logger.error(f"Не удалось уведомить пользователя @{username}: {e}")
+
+    await message.answer(
+        f"✅ Пользователь @{username} добавлен в черный список\nПричина: {reason}"
+    )
 
     await state.clear()
 
@@ -430,24 +518,21 @@ async def process_unban_user(message: Message, state: FSMContext):
     user_id = data["user_id"]
     username = data["username"]
 
-    async with AsyncSessionLocal() as session:
-        # Обновляем статус пользователя
-        user = await session.get(DBUser, user_id)
-        user.is_banned = False
-        await session.commit()
-
-        # Отправляем уведомление пользователю (если возможно)
-        try:
-            await bot.send_message(
-                chat_id=user_id,
-                text=f"✅ Вы были исключены из черного списка!\nПричина: {reason}",
-            )
-        except Exception as e:
-            logger.error(f"Не удалось уведомить пользователя @{username}: {e}")
+    await writer.submit(_set_banned(user_id, False))
+    ban_cache.invalidate(user_id, False)
 
-        await message.answer(
-            f"✅ Пользователь @{username} исключен из черного списка\nПричина: {reason}"
+    # Отправляем уведомление пользователю (если возможно)
+    try:
+        await bot.send_message(
+            chat_id=user_id,
+            text=f"✅ Вы были исключены из черного списка!\nПричина: {reason}",
         )
+    except Exception as e:
+        logger.error(f"Не удалось уведомить пользователя @{username}: {e}")
+
+    await message.answer(
+        f"✅ Пользователь @{username} исключен из черного списка\nПричина: {reason}"
+    )
 
     await state.clear()
 
@@ -464,7 +549,7 @@ async def list_banned_users(message: Message):
         await message.answer("❌ Эта команда доступна только администраторам")
         return
 
-    async with AsyncSessionLocal() as session:
+    async with ReadSessionLocal() as session:
         banned_users = await get_banned_users(session)
 
     if banned_users:
@@ -478,62 +563,133 @@ async def list_banned_users(message: Message):
     await message.answer(message_text)
 
 
+class NewOrdersPage(CallbackData, prefix="new_orders"):
+    after: int  # id последнего показанного заказа
+
+
 @dp.message(F.text == "📦 Новые заказы")
 async def show_new_orders(message: types.Message):
     if not await is_courier_or_admin(message.from_user.id):
         await message.answer("⛔ У вас нет доступа к этой команде")
         return
+    await send_new_orders(message)
 
+
+@dp.callback_query(NewOrdersPage.filter())
+async def new_orders_page(callback: CallbackQuery, callback_data: NewOrdersPage):
+    """Следующая страница новых заказов"""
+    if not await is_courier_or_admin(callback.from_user.id):
+        await callback.answer("⛔ У вас нет доступа к этой команде", show_alert=True)
+        return
+    await callback.answer()
     try:
-        async with AsyncSessionLocal() as db:
+        # Кнопка нужна один раз: следующая страница придет новыми сообщениями
+        await callback.message.edit_reply_markup(reply_markup=None)
+    except TelegramBadRequest:
+        pass
+    await send_new_orders(callback.message, callback_data.after)
+
+
+async def send_new_orders(message: types.Message, after: int = 0):
+    """Страница новых заказов по порядку created_at, начиная после заказа after.
+
+    Страница не больше всплеска, который лимитер пропускает в чат без пауз
+    (карточки и сообщение с кнопкой «Показать еще»), поэтому уходит за секунды,
+    а карточки, отправляемые по очереди, приходят в порядке заказов.
+    """
+    page_size = NEW_ORDERS_PAGE_SIZE or max(1, telegram_limiter.chat_burst - 1)
+    try:
+        async with ReadSessionLocal() as db:
             stmt = (
                 select(Order)
                 .where(Order.status == "waiting_for_courier")
-                .order_by(Order.created_at.asc())
+                .order_by(Order.created_at.asc(), Order.id.asc())
+                .limit(page_size + 1)
                 .options(
                     joinedload(Order.user),
                     selectinload(Order.items).joinedload(OrderItem.item),
                 )
             )
+            if after:
+                # Keyset: взятые в работу заказы не сдвигают следующую страницу
+                after_created_at = (
+                    select(Order.created_at).where(Order.id == after).scalar_subquery()
+                )
+                stmt = stmt.where(
+                    or_(
+                        Order.created_at > after_created_at,
+                        and_(Order.created_at == after_created_at, Order.id > after),
+                    )
+                )
 
             result = await db.execute(stmt)
             orders = result.unique().scalars().all()
 
             if not orders:
                 await message.answer(
-                    "📭 На данный момент нет новых заказов для доставки"
+                    "📭 Больше новых заказов нет"
+                    if after
+                    else "📭 На данный момент нет новых заказов для доставки"
                 )
                 return
 
-            for order in orders:
-                try:
-                    count_stmt = select(func.count(Order.id)).where(
-                        Order.user_id == order.user_id
-                    )
-                    orders_count = (await db.execute(count_stmt)).scalar() or 0
-                    order_info = format_order_info(order, orders_count)
+            has_more = len(orders) > page_size
+            orders = orders[:page_size]
+            counts = await orders_counts(db, (order.user_id for order in orders))
+            cards = [
+                (order, format_order_info(order, counts.get(order.user_id, 0)))
+                for order in orders
+            ]
 
-                    # Отправляем сообщение и сохраняем его ID
-                    sent_message = await message.answer(
+        async def send(order: Order, order_info: str):
+            for _ in range(CARD_SEND_ATTEMPTS):
+                await telegram_limiter.wait(message.chat.id)
+                try:
+                    return await message.answer(
                         order_info,
                         parse_mode="MarkdownV2",
                         reply_markup=get_courier_keyboard(order.id, order.status),
                     )
-
-                    # Сохраняем ID сообщения бота в заказе
-                    if not order.bot_message_ids:
-                        order.bot_message_ids = []
-                    # Добавляем новый ID только если его еще нет в списке
-                    if sent_message.message_id not in order.bot_message_ids:
-                        order.bot_message_ids.append(sent_message.message_id)
-                        await db.commit()
-
+                except TelegramRetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
                 except Exception as order_error:
                     logger.error(
                         f"Ошибка при обработке заказа {order.id}: {str(order_error)}",
                         exc_info=True,
                     )
-                    continue
+                    return None
+            logger.error(
+                f"Карточка заказа {order.id} не отправлена в чат {message.chat.id}: "
+                f"Telegram {CARD_SEND_ATTEMPTS} раз ответил RetryAfter"
+            )
+            return None
+
+        # Все карточки идут в один чат: по очереди, чтобы сохранить порядок created_at.
+        # Запросы к БД и форматирование уже сделаны пачкой, id сообщений — одной записью
+        sent = [await send(order, order_info) for order, order_info in cards]
+        await writer.submit(
+            order_messages.remember_many(
+                (order.id, sent_message.chat.id, sent_message.message_id, order_messages.CARD)
+                for (order, _), sent_message in zip(cards, sent)
+                if sent_message is not None
+            )
+        )
+
+        if has_more:
+            await telegram_limiter.wait(message.chat.id)
+            await message.answer(
+                f"Показано заказов: {len(orders)}, есть еще",
+                reply_markup=InlineKeyboardMarkup(
+                    inline_keyboard=[
+                        [
+                            InlineKeyboardButton(
+                                text="⬇️ Показать еще",
+                                callback_data=NewOrdersPage(after=orders[-1].id).pack(),
+                            )
+                        ]
+                    ]
+                ),
+            )
 
     except Exception as e:
         logger.error(
@@ -550,7 +706,7 @@ async def show_active_orders(message: types.Message):
         return
     courier_id = message.from_user.id
 
-    async with AsyncSessionLocal() as db:
+    async with ReadSessionLocal() as db:
         try:
             # Получаем активные заказы курьера
             orders = await db.execute(
@@ -641,7 +797,7 @@ async def show_completed_orders_list(callback: CallbackQuery):
     is_admin = user_id in ADMINS
 
     try:
-        async with AsyncSessionLocal() as db:
+        async with ReadSessionLocal() as db:
             if is_admin:
                 # Для админов показываем все завершенные заказы
                 stmt = (
@@ -740,7 +896,7 @@ async def show_canceled_orders_list(callback: CallbackQuery):
     is_admin = user_id in ADMINS
 
     try:
-        async with AsyncSessionLocal() as db:
+        async with ReadSessionLocal() as db:
             # Для админов показываем все отмененные заказы
             # Для курьеров - только те, что были назначены им
             if is_admin:
@@ -975,13 +1131,23 @@ async def start_delivery(callback: types.CallbackQuery):
         # Обновляем заказ
         order.status = "in_delivery"
         order.courier_id = courier.id
+        await record_status_change(
+            db,
+            order,
+            "waiting_for_courier",
+            "in_delivery",
+            actor=f"tg:{callback.from_user.id}",
+        )
         await db.commit()
 
         # Получаем информацию о пользователе для уведомления
         username = order.user.username if order.user else None
+        orders_count = await db.scalar(
+            select(func.count(Order.id)).where(Order.user_id == order.user_id)
+        )
 
-        # Формируем информацию о заказе ДО закрытия сессии
-        order_info = format_order_info(order, 0, username)
+        # Формируем информацию о заказе ДО закрытия сессии, один раз на все копии
+        order_info = format_order_info(order, orders_count or 0, username)
 
         # Уведомляем пользователя
         await notify_user(
@@ -993,15 +1159,10 @@ async def start_delivery(callback: types.CallbackQuery):
             f"Статус: В процессе доставки",
         )
 
-    # После закрытия сессии работаем с уже полученными данными
-    try:
-        await callback.message.edit_text(
-            order_info,
-            parse_mode="MarkdownV2",
-            reply_markup=get_courier_keyboard(order_id, "in_delivery"),
-        )
-    except Exception as e:
-        logger.error(f"Ошибка при редактировании сообщения: {e}")
+    # Обновляем карточку у всех курьеров и админов, чтобы заказ не пытались взять повторно
+    if not await refresh_order_cards(
+        order_id, order_info, "in_delivery", actor_message=callback.message
+    ):
         await callback.message.answer(
             order_info,
             parse_mode="MarkdownV2",
@@ -1054,13 +1215,19 @@ async def complete_delivery(callback: types.CallbackQuery):
 
         # Обновляем статус заказа
         order.status = "delivered"
+        await record_status_change(
+            db, order, "in_delivery", "delivered", actor=f"tg:{callback.from_user.id}"
+        )
         await db.commit()
 
         # Получаем информацию о пользователе
         username = order.user.username if order.user else None
+        orders_count = await db.scalar(
+            select(func.count(Order.id)).where(Order.user_id == order.user_id)
+        )
 
-        # Формируем информацию о заказе ДО закрытия сессии
-        order_info = format_order_info(order, 0, username)
+        # Формируем информацию о заказе ДО закрытия сессии, один раз на все копии
+        order_info = format_order_info(order, orders_count or 0, username)
 
         # Уведомляем пользователя
         await notify_user(
@@ -1073,15 +1240,10 @@ async def complete_delivery(callback: types.CallbackQuery):
             f"Статус: Доставлен",
         )
 
-    # После закрытия сессии работаем с уже полученными данными
-    try:
-        await callback.message.edit_text(
-            order_info,
-            parse_mode="MarkdownV2",
-            reply_markup=get_courier_keyboard(order_id, "delivered"),
-        )
-    except Exception as e:
-        logger.error(f"Ошибка при редактировании сообщения: {e}")
+    # Обновляем все копии карточки заказа
+    if not await refresh_order_cards(
+        order_id, order_info, "delivered", actor_message=callback.message
+    ):
         await callback.message.answer(
             order_info,
             parse_mode="MarkdownV2",
@@ -1123,19 +1285,13 @@ async def finish_order(callback: types.CallbackQuery):
             await callback.answer("Невозможно завершить этот заказ", show_alert=True)
             return
 
-        # Сохраняем список ID сообщений и получаем список всех курьеров для удаления сообщений
-        message_ids_to_delete = (
-            order.bot_message_ids.copy() if order.bot_message_ids else []
-        )
+        # Сообщения о заказе забираем в той же транзакции, что и смену статуса
+        messages_to_delete = await order_messages.pop(db, order_id)
 
-        # Получаем всех курьеров и админов для удаления сообщений из их чатов
-        all_couriers = await db.execute(select(Courier))
-        courier_user_ids = [c.user_id for c in all_couriers.scalars().all()]
-        all_user_ids = courier_user_ids + ADMINS  # Добавляем админов
-
-        # Меняем статус заказа на завершенный и очищаем bot_message_ids
         order.status = "completed"
-        order.bot_message_ids = []
+        await record_status_change(
+            db, order, "delivered", "completed", actor=f"tg:{callback.from_user.id}"
+        )
         await db.commit()
 
         # Уведомляем пользователя
@@ -1143,15 +1299,8 @@ async def finish_order(callback: types.CallbackQuery):
             order_id, f"🏁 Ваш заказ #{order_id} успешно завершен!\nСпасибо за покупку!"
         )
 
-    # Удаляем сообщения из всех чатов курьеров и админов
-    if message_ids_to_delete:
-        for user_id in all_user_ids:
-            try:
-                await delete_bot_messages(user_id, message_ids_to_delete)
-            except Exception as e:
-                logger.error(
-                    f"Ошибка при удалении сообщений у пользователя {user_id}: {e}"
-                )
+    # Удаляем сообщения о заказе ровно в тех чатах, куда они отправлялись
+    await order_messages.delete_messages(bot, messages_to_delete, telegram_limiter)
 
     # Удаляем текущее сообщение с кнопками
     try:
@@ -1233,36 +1382,22 @@ async def cancel_order(callback: types.CallbackQuery, state: FSMContext):
                 )
                 return
 
-            # Сохраняем данные для последующего удаления сообщений
             chat_id = callback.message.chat.id
-            message_ids_to_delete = []
-
-            # Добавляем текущее сообщение в список для удаления
-            message_ids_to_delete.append(callback.message.message_id)
-
-            # Добавляем все сообщения бота о заказе
-            if order.bot_message_ids:
-                message_ids_to_delete.extend(order.bot_message_ids)
 
             # Для админов - сразу отменяем без запроса причины
             if is_admin:
-                # Получаем всех курьеров для удаления сообщений из их чатов
-                all_couriers = await db.execute(select(Courier))
-                courier_user_ids = [c.user_id for c in all_couriers.scalars().all()]
-                all_user_ids = courier_user_ids + ADMINS  # Добавляем админов
+                messages_to_delete = await order_messages.pop(db, order_id)
+                messages_to_delete.append((chat_id, callback.message.message_id))
 
+                old_status = order.status
                 order.status = "canceled"
-                order.bot_message_ids = []  # Очищаем список сообщений
+                await record_status_change(
+                    db, order, old_status, "canceled", actor=f"tg:{callback.from_user.id}"
+                )
                 await db.commit()
 
-                # Удаляем все связанные сообщения из всех чатов
-                for user_id in all_user_ids:
-                    try:
-                        await delete_bot_messages(user_id, message_ids_to_delete)
-                    except Exception as e:
-                        logger.error(
-                            f"Ошибка при удалении сообщений у пользователя {user_id}: {e}"
-                        )
+                # Удаляем все связанные сообщения ровно в их чатах
+                await order_messages.delete_messages(bot, messages_to_delete, telegram_limiter)
 
                 # Уведомления
                 notification_text = f"❌ Заказ #{order_id} отменен администратором"
@@ -1276,11 +1411,15 @@ async def cancel_order(callback: types.CallbackQuery, state: FSMContext):
                 await callback.answer("Заказ отменен администратором", show_alert=True)
                 return
 
-            # Для курьеров - запрашиваем причину
+            # Для курьеров - запрашиваем причину; текущее сообщение удалим вместе с остальными
+            await writer.submit(
+                order_messages.remember(
+                    order_id, chat_id, callback.message.message_id, order_messages.CANCEL_PROMPT
+                )
+            )
             await state.update_data(
                 order_id=order_id,
                 chat_id=chat_id,
-                message_ids_to_delete=message_ids_to_delete,
                 is_admin=is_admin,
             )
             await state.set_state(CourierStates.waiting_for_problem_description)
@@ -1289,8 +1428,12 @@ async def cancel_order(callback: types.CallbackQuery, state: FSMContext):
                 reason_msg = await callback.message.answer(
                     f"📝 Укажите причину отмены заказа #{order_id}:"
                 )
-                # Добавляем сообщение с запросом причины в список для удаления
-                await state.update_data(reason_message_id=reason_msg.message_id)
+                # Сообщение с запросом причины тоже удаляется после отмены
+                await writer.submit(
+                    order_messages.remember(
+                        order_id, chat_id, reason_msg.message_id, order_messages.CANCEL_PROMPT
+                    )
+                )
                 await callback.answer()
             except Exception as e:
                 logger.error(f"Ошибка запроса причины: {e}")
@@ -1309,41 +1452,27 @@ async def cancel_order(callback: types.CallbackQuery, state: FSMContext):
 async def process_cancel_reason(message: Message, state: FSMContext):
     data = await state.get_data()
     order_id = data["order_id"]
-    data["chat_id"]
-    message_ids_to_delete = data.get("message_ids_to_delete", [])
-    reason_message_id = data.get("reason_message_id")
     is_admin = data.get("is_admin", False)
 
     async with AsyncSessionLocal() as db:
         order = await db.get(Order, order_id)
         if order:
             try:
-                # Добавляем текущее сообщение с причиной в список для удаления
-                if message.message_id not in message_ids_to_delete:
-                    message_ids_to_delete.append(message.message_id)
-
-                if reason_message_id and reason_message_id not in message_ids_to_delete:
-                    message_ids_to_delete.append(reason_message_id)
-
-                # Получаем всех курьеров для удаления сообщений из их чатов
-                all_couriers = await db.execute(select(Courier))
-                courier_user_ids = [c.user_id for c in all_couriers.scalars().all()]
-                all_user_ids = courier_user_ids + ADMINS  # Добавляем админов
-
-                # Удаляем все связанные сообщения из всех чатов
-                for user_id in all_user_ids:
-                    try:
-                        await delete_bot_messages(user_id, message_ids_to_delete)
-                    except Exception as e:
-                        logger.error(
-                            f"Ошибка при удалении сообщений у пользователя {user_id}: {e}"
-                        )
+                # Сообщения о заказе плюс ответ с причиной
+                messages_to_delete = await order_messages.pop(db, order_id)
+                messages_to_delete.append((message.chat.id, message.message_id))
 
                 # Обновляем статус заказа
+                old_status = order.status
                 order.status = "canceled"
-                order.bot_message_ids = []  # Очищаем список сообщений
+                await record_status_change(
+                    db, order, old_status, "canceled", actor=f"tg:{message.from_user.id}"
+                )
                 await db.commit()
 
+                # Удаляем все связанные сообщения ровно в их чатах
+                await order_messages.delete_messages(bot, messages_to_delete, telegram_limiter)
+
                 # Уведомляем пользователя
                 await notify_user(
                     order_id,
@@ -1400,6 +1529,11 @@ async def save_photo(file_id: str) -> str:
         logger.info(f"[save_photo] Successfully downloaded file to {save_path}")
 
         result_path = f"/uploads/{file_name}"
+        # Картинка уже лежит в Telegram: в списках отправляем ее по file_id, без загрузки
+        try:
+            await writer.submit(telegram_files.remember(result_path, file_id))
+        except Exception as e:
+            logger.warning(f"[save_photo] file_id not cached for {result_path}: {e}")
         logger.info(f"[save_photo] Returning path: {result_path}")
         return result_path
     except Exception as e:
@@ -1407,6 +1541,25 @@ async def save_photo(file_id: str) -> str:
         raise
 
 
+async def answer_image(message: Message, image: str, caption: str, file_id: str = None):
+    """Отвечает картинкой из uploads/: по file_id из кэша, а если Telegram его
+    не принял или кэша нет — загрузкой с диска с запоминанием нового file_id.
+    """
+    if file_id:
+        try:
+            await message.answer_photo(file_id, caption=caption)
+            return
+        except TelegramBadRequest as e:
+            logger.warning(f"file_id для {image} не принят, загружаем заново: {e}")
+
+    full_image_path = os.path.join(os.getcwd(), image.lstrip("/"))
+    if not os.path.exists(full_image_path):
+        await message.answer(caption)
+        return
+    sent = await message.answer_photo(FSInputFile(full_image_path), caption=caption)
+    await writer.submit(telegram_files.remember(image, sent.photo[-1].file_id))
+
+
 async def _handle_item_image(message: Message, state: FSMContext, file_id: str):
     """Helper function for processing item images (both photo and document)"""
     try:
@@ -1554,6 +1707,9 @@ async def cancel_delivered_order(callback: CallbackQuery, state: FSMContext):
 
             # Обновляем статус
             order.status = "canceled"
+            await record_status_change(
+                db, order, "delivered", "canceled", actor=f"tg:{user_id}"
+            )
             await db.commit()
 
             # Уведомляем пользователя
@@ -1638,6 +1794,7 @@ async def cmd_start(message: Message):
             types.KeyboardButton(text="❌ Отмененные"),
             types.KeyboardButton(text="✅ Завершенные"),
         )
+        builder.row(types.KeyboardButton(text="📤 Экспорт"))
         builder.row(
             types.KeyboardButton(text="📋 Заблокированные пользователи"),
             types.KeyboardButton(text="⛔ Забанить пользователя"),
@@ -2077,6 +2234,9 @@ async def process_courier_car_model(message: Message, state: FSMContext):
                 await state.clear()
                 return
 
+            # Курьер мог еще не открывать бота: без строки users вставка нарушит FK
+            await users.ensure_user(session, data["user_id"], data["username"])
+
             # Создаем нового курьера
             new_courier = Courier(
                 user_id=data["user_id"],
@@ -2210,11 +2370,27 @@ async def analytics_end_orders(message: Message, state: FSMContext):
     )
 
 
-async def _fetch_json(url: str, params: dict | None = None) -> dict:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as resp:
-            resp.raise_for_status()
-            return await resp.json()
+@dp.message(F.text == "📤 Экспорт")
+async def analytics_export_start(message: Message, state: FSMContext):
+    if message.from_user.id not in ADMINS:
+        return
+    await message.answer(
+        "Выберите период для экспорта заказов (CSV):",
+        reply_markup=_period_buttons(),
+    )
+
+
+async def _handle_export(callback: CallbackQuery, params: dict):
+    try:
+        data, filename = await analytics.export_file(params)
+        await callback.message.answer_document(
+            BufferedInputFile(data, filename=filename),
+            caption="📤 Экспорт заказов",
+        )
+    except Exception as e:
+        await callback.message.answer(f"❌ Ошибка экспорта: {e}")
+    finally:
+        await callback.answer()
 
 
 def _format_sales(
@@ -2249,10 +2425,10 @@ def _format_sales(
     for s in sales[offset : offset + limit]:
         # Форматируем дату если она в формате datetime
         created_at = s.get("created_at", "")
-        if isinstance(created_at, str) and "T" in created_at:
+        if isinstance(created_at, datetime):
+            created_at = created_at.strftime("%d.%m.%Y %H:%M")
+        elif isinstance(created_at, str) and "T" in created_at:
             try:
-                from datetime import datetime
-
                 dt = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
                 created_at = dt.strftime("%d.%m.%Y %H:%M")
             except:
@@ -2291,10 +2467,9 @@ def _format_turnover(response: dict) -> str:
 async def _handle_analytics(
     callback: CallbackQuery, endpoint: str, period_key: str | None, state: FSMContext
 ):
-    base_url = os.getenv("BACKEND_URL", "https://tgifts.space")
     params = {"period": period_key} if period_key else None
     try:
-        data = await _fetch_json(f"{base_url}{endpoint}", params)
+        data = await analytics.run_report(endpoint, params)
         if (
             endpoint.endswith("/sales")
             or endpoint.endswith("/canceled_orders")
@@ -2341,10 +2516,9 @@ async def on_sales_more(callback: CallbackQuery):
         period = (
             "_".join(parts[4:]) if len(parts) > 4 else "custom"
         )  # parts[4:] = ["custom"]
-        base_url = os.getenv("BACKEND_URL", "https://tgifts.space")
 
         params = {"period": None if period == "custom" else period}
-        data = await _fetch_json(f"{base_url}/analytics/sales", params)
+        data = await analytics.run_report("/analytics/sales", params)
 
         text, remaining = _format_sales(
             data, offset=offset, limit=20, is_canceled=False, is_completed=False
@@ -2390,6 +2564,7 @@ async def on_sales_more(callback: CallbackQuery):
 async def on_period_quick(callback: CallbackQuery, state: FSMContext):
     # Определяем, что именно запросил пользователь: продажи, оборот, отмененные или завершенные заказы
     last_text = callback.message.text or ""
+    is_export = "экспорт" in last_text.lower()
     is_sales = "продаж" in last_text.lower()
     is_canceled = "отменен" in last_text.lower()
     is_completed = "завершен" in last_text.lower()
@@ -2401,6 +2576,10 @@ async def on_period_quick(callback: CallbackQuery, state: FSMContext):
     }
     period = period_map.get(callback.data, "today")
 
+    if is_export:
+        await _handle_export(callback, {"period": period})
+        return
+
     if is_canceled:
         endpoint = "/analytics/canceled_orders"
     elif is_completed:
@@ -2456,6 +2635,12 @@ async def on_period_input(message: Message, state: FSMContext):
                         callback_data=f"an_custom_completed_{start}_{end}",
                     )
                 ],
+                [
+                    InlineKeyboardButton(
+                        text="📤 Экспорт CSV",
+                        callback_data=f"an_custom_export_{start}_{end}",
+                    )
+                ],
             ]
         )
         await message.answer("Выберите тип отчета:", reply_markup=kb)
@@ -2466,10 +2651,9 @@ async def on_period_input(message: Message, state: FSMContext):
 @dp.callback_query(F.data.startswith("an_custom_sales_"))
 async def on_custom_sales(callback: CallbackQuery):
     _, _, start, end = callback.data.split("_", 3)
-    base_url = os.getenv("BACKEND_URL", "https://tgifts.space")
     try:
-        data = await _fetch_json(
-            f"{base_url}/analytics/sales", {"start": start, "end": end}
+        data = await analytics.run_report(
+            "/analytics/sales", {"start": start, "end": end}
         )
         text, remaining = _format_sales(data, is_canceled=False, is_completed=False)
         kb = None
@@ -2494,10 +2678,9 @@ async def on_custom_sales(callback: CallbackQuery):
 @dp.callback_query(F.data.startswith("an_custom_turnover_"))
 async def on_custom_turnover(callback: CallbackQuery):
     _, _, start, end = callback.data.split("_", 3)
-    base_url = os.getenv("BACKEND_URL", "https://tgifts.space")
     try:
-        data = await _fetch_json(
-            f"{base_url}/analytics/turnover", {"start": start, "end": end}
+        data = await analytics.run_report(
+            "/analytics/turnover", {"start": start, "end": end}
         )
         await callback.message.answer(_format_turnover(data))
     except Exception as e:
@@ -2509,10 +2692,9 @@ async def on_custom_turnover(callback: CallbackQuery):
 @dp.callback_query(F.data.startswith("an_custom_canceled_"))
 async def on_custom_canceled(callback: CallbackQuery):
     _, _, start, end = callback.data.split("_", 3)
-    base_url = os.getenv("BACKEND_URL", "https://tgifts.space")
     try:
-        data = await _fetch_json(
-            f"{base_url}/analytics/canceled_orders", {"start": start, "end": end}
+        data = await analytics.run_report(
+            "/analytics/canceled_orders", {"start": start, "end": end}
         )
         text, remaining = _format_sales(data, is_canceled=True, is_completed=False)
         kb = None
@@ -2537,10 +2719,9 @@ async def on_custom_canceled(callback: CallbackQuery):
 @dp.callback_query(F.data.startswith("an_custom_completed_"))
 async def on_custom_completed(callback: CallbackQuery):
     _, _, start, end = callback.data.split("_", 3)
-    base_url = os.getenv("BACKEND_URL", "https://tgifts.space")
     try:
-        data = await _fetch_json(
-            f"{base_url}/analytics/completed_orders", {"start": start, "end": end}
+        data = await analytics.run_report(
+            "/analytics/completed_orders", {"start": start, "end": end}
         )
         text, remaining = _format_sales(data, is_completed=True)
         kb = None
@@ -2562,6 +2743,12 @@ async def on_custom_completed(callback: CallbackQuery):
         await callback.answer()
 
 
+@dp.callback_query(F.data.startswith("an_custom_export_"))
+async def on_custom_export(callback: CallbackQuery):
+    _, _, _, start, end = callback.data.split("_", 4)
+    await _handle_export(callback, {"start": start, "end": end})
+
+
 @dp.callback_query(F.data.startswith("an_canceled_more_"))
 async def on_canceled_more(callback: CallbackQuery):
     try:
@@ -2571,10 +2758,9 @@ async def on_canceled_more(callback: CallbackQuery):
         period = (
             "_".join(parts[4:]) if len(parts) > 4 else "custom"
         )  # parts[4:] = ["custom"]
-        base_url = os.getenv("BACKEND_URL", "https://tgifts.space")
 
         params = {"period": None if period == "custom" else period}
-        data = await _fetch_json(f"{base_url}/analytics/canceled_orders", params)
+        data = await analytics.run_report("/analytics/canceled_orders", params)
 
         text, remaining = _format_sales(
             data, offset=offset, limit=20, is_canceled=True, is_completed=False
@@ -2621,10 +2807,9 @@ async def on_completed_more(callback: CallbackQuery):
         period = (
             "_".join(parts[4:]) if len(parts) > 4 else "custom"
         )  # parts[4:] = ["custom"]
-        base_url = os.getenv("BACKEND_URL", "https://tgifts.space")
 
         params = {"period": None if period == "custom" else period}
-        data = await _fetch_json(f"{base_url}/analytics/completed_orders", params)
+        data = await analytics.run_report("/analytics/completed_orders", params)
 
         text, remaining = _format_sales(
             data, offset=offset, limit=20, is_completed=True
@@ -2666,23 +2851,11 @@ async def manage_item_tastes_start(message: Message):
     if message.from_user.id not in ADMINS:
         return
 
-    async with AsyncSessionLocal() as session:
-        items = (
-            (await session.execute(select(Item).order_by(Item.name))).scalars().all()
-        )
-        if not items:
-            await message.answer("ℹ️ Нет товаров для управления вкусами")
-            return
-        builder = InlineKeyboardBuilder()
-        for item in items:
-            builder.add(
-                InlineKeyboardButton(
-                    text=f"{item.name} (ID: {item.id})",
-                    callback_data=f"manage_tastes_item_{item.id}",
-                )
-            )
-        builder.adjust(1)
-        await message.answer("Выберите товар:", reply_markup=builder.as_markup())
+    markup = await pagination.render_page("items_tastes")
+    if markup is None:
+        await message.answer("ℹ️ Нет товаров для управления вкусами")
+        return
+    await message.answer("Выберите товар:", reply_markup=markup)
 
 
 @dp.callback_query(F.data.startswith("manage_tastes_item_"))
@@ -2768,54 +2941,15 @@ async def taste_remove(callback: CallbackQuery):
         await callback.answer("Неверный ID", show_alert=True)
         return
 
-    async with AsyncSessionLocal() as session:
-        item = (
-            (
-                await session.execute(
-                    select(Item)
-                    .where(Item.id == item_id)
-                    .options(selectinload(Item.tastes))
-                )
-            )
-            .scalars()
-            .first()
-        )
-        if not item:
-            await callback.answer("Товар не найден", show_alert=True)
-            return
-
-    all_tastes = (
-        (await session.execute(select(Taste).order_by(Taste.name))).scalars().all()
-    )
-    attached_ids = {t.id for t in (item.tastes or [])}
-    attached = [t for t in all_tastes if t.id in attached_ids]
-
-    MAX_BUTTONS_PER_PAGE = 90
-    if attached:
-        rm_builder = InlineKeyboardBuilder()
-        attached_to_show = attached[:MAX_BUTTONS_PER_PAGE]
-        for t in attached_to_show:
-            rm_builder.add(
-                InlineKeyboardButton(
-                    text=f"❌ {t.name}",
-                    callback_data=f"taste_delete_{item.id}_{t.id}",
-                )
-            )
-            rm_builder.adjust(2)
-
-        # Если вкусов больше чем лимит, показываем предупреждение
-        if len(attached) > MAX_BUTTONS_PER_PAGE:
-            rm_builder.row(
-                InlineKeyboardButton(
-                    text=f"⚠️ Показано {MAX_BUTTONS_PER_PAGE} из {len(attached)} вкусов",
-                    callback_data="noop",
-                )
-            )
+    async with ReadSessionLocal() as session:
+        item_name = await session.scalar(select(Item.name).where(Item.id == item_id))
+    if item_name is None:
+        await callback.answer("Товар не найден", show_alert=True)
+        return
 
-        await callback.message.answer(
-            f"Удалить вкусы у «{item.name}»:",
-            reply_markup=rm_builder.as_markup(),
-        )
+    markup = await pagination.render_page("tastes_remove", context=item_id)
+    if markup is not None:
+        await callback.message.answer(f"Удалить вкусы у «{item_name}»:", reply_markup=markup)
     else:
         await callback.message.answer("У товара пока нет прикрепленных вкусов")
 
@@ -2980,106 +3114,35 @@ async def search_taste_process(message: Message, state: FSMContext):
         await state.clear()
         return
 
-    async with AsyncSessionLocal() as session:
-        # Загружаем товар с его вкусами
-        item = (
-            (
-                await session.execute(
-                    select(Item)
-                    .where(Item.id == item_id)
-                    .options(selectinload(Item.tastes))
-                )
-            )
-            .scalars()
-            .first()
-        )
-        if not item:
-            await message.answer("Товар не найден")
-            await state.clear()
-            return
-
-        # Ищем вкусы по частичному совпадению
-        search_pattern = f"%{search_query}%"
-        found_tastes = (
-            (
-                await session.execute(
-                    select(Taste)
-                    .where(Taste.name.ilike(search_pattern))
-                    .order_by(Taste.name)
-                )
-            )
-            .scalars()
-            .all()
-        )
-
-        attached_ids = {t.id for t in (item.tastes or [])}
-        available = [t for t in found_tastes if t.id not in attached_ids]
-        attached = [t for t in found_tastes if t.id in attached_ids]
-
-        if not found_tastes:
-            await message.answer(f"❌ Вкусы по запросу «{search_query}» не найдены")
-            await state.clear()
-            return
-
-        # Показываем найденные вкусы для добавления
-        if available:
-            add_builder = InlineKeyboardBuilder()
-            add_builder.row(
-                InlineKeyboardButton(
-                    text="🆕 Создать новый вкус",
-                    callback_data=f"create_new_taste_{item_id}",
-                )
-            )
-
-            # Ограничиваем количество кнопок
-            MAX_BUTTONS_PER_PAGE = 90
-            tastes_to_show = available[:MAX_BUTTONS_PER_PAGE]
-            for t in tastes_to_show:
-                add_builder.add(
-                    InlineKeyboardButton(
-                        text=f"➕ {t.name}", callback_data=f"taste_add_{item_id}_{t.id}"
-                    )
-                )
-            add_builder.adjust(2)
-
-            if len(available) > MAX_BUTTONS_PER_PAGE:
-                add_builder.row(
-                    InlineKeyboardButton(
-                        text=f"⚠️ Показано {MAX_BUTTONS_PER_PAGE} из {len(available)} найденных вкусов",
-                        callback_data="noop",
-                    )
-                )
-
-            await message.answer(
-                f"🔍 Найденные вкусы по запросу «{search_query}» для добавления к «{item.name}»:",
-                reply_markup=add_builder.as_markup(),
-            )
-
-        # Показываем найденные вкусы для удаления
-        if attached:
-            rm_builder = InlineKeyboardBuilder()
-            attached_to_show = attached[:MAX_BUTTONS_PER_PAGE]
-            for t in attached_to_show:
-                rm_builder.add(
-                    InlineKeyboardButton(
-                        text=f"❌ {t.name}",
-                        callback_data=f"taste_remove_{item_id}_{t.id}",
-                    )
-                )
-            rm_builder.adjust(2)
+    async with ReadSessionLocal() as session:
+        item_name = await session.scalar(select(Item.name).where(Item.id == item_id))
+    if item_name is None:
+        await message.answer("Товар не найден")
+        await state.clear()
+        return
 
-            if len(attached) > MAX_BUTTONS_PER_PAGE:
-                rm_builder.row(
-                    InlineKeyboardButton(
-                        text=f"⚠️ Показано {MAX_BUTTONS_PER_PAGE} из {len(attached)} найденных вкусов",
-                        callback_data="noop",
-                    )
-                )
+    # Найденные вкусы: для добавления (еще не прикреплены) и для удаления
+    add_markup = await pagination.render_page(
+        "tastes_add", context=item_id, query=search_query
+    )
+    remove_markup = await pagination.render_page(
+        "tastes_remove", context=item_id, query=search_query
+    )
+    if add_markup is None and remove_markup is None:
+        await message.answer(f"❌ Вкусы по запросу «{search_query}» не найдены")
+        await state.clear()
+        return
 
-            await message.answer(
-                f"🔍 Найденные вкусы по запросу «{search_query}» для удаления у «{item.name}»:",
-                reply_markup=rm_builder.as_markup(),
-            )
+    if add_markup is not None:
+        await message.answer(
+            f"🔍 Найденные вкусы по запросу «{search_query}» для добавления к «{item_name}»:",
+            reply_markup=add_markup,
+        )
+    if remove_markup is not None:
+        await message.answer(
+            f"🔍 Найденные вкусы по запросу «{search_query}» для удаления у «{item_name}»:",
+            reply_markup=remove_markup,
+        )
 
     await state.clear()
 
@@ -3089,23 +3152,11 @@ async def manage_item_start(message: Message):
     if message.from_user.id not in ADMINS:
         return
 
-    async with AsyncSessionLocal() as session:
-        items = (
-            (await session.execute(select(Item).order_by(Item.name))).scalars().all()
-        )
-        if not items:
-            await message.answer("ℹ️ Нет товаров")
-            return
-        builder = InlineKeyboardBuilder()
-        for item in items:
-            builder.add(
-                InlineKeyboardButton(
-                    text=f"{item.name} (ID: {item.id})",
-                    callback_data=f"manage_item_{item.id}",
-                )
-            )
-        builder.adjust(1)
-        await message.answer("Выберите товар:", reply_markup=builder.as_markup())
+    markup = await pagination.render_page("items_manage")
+    if markup is None:
+        await message.answer("ℹ️ Нет товаров")
+        return
+    await message.answer("Выберите товар:", reply_markup=markup)
 
 
 @dp.callback_query(F.data.startswith("manage_item_"))
@@ -3373,6 +3424,94 @@ async def change_item_price(message: Message, state: FSMContext):
     await state.clear()
 
 
+def _item_button(callback_prefix: str):
+    def button(item_id: int, name: str, context: int) -> InlineKeyboardButton:
+        return InlineKeyboardButton(
+            text=f"{name} (ID: {item_id})", callback_data=f"{callback_prefix}{item_id}"
+        )
+
+    return button
+
+
+def _items_statement(context: int, query: str):
+    return select(Item.id, Item.name).order_by(Item.name, Item.id)
+
+
+def _item_tastes_statement(attached: bool):
+    def statement(item_id: int, query: str):
+        is_attached = exists().where(
+            item_taste_association.c.item_id == item_id,
+            item_taste_association.c.taste_id == Taste.id,
+        )
+        stmt = (
+            select(Taste.id, Taste.name)
+            .where(is_attached if attached else ~is_attached)
+            .order_by(Taste.name)
+        )
+        if query:
+            stmt = stmt.where(Taste.name.ilike(f"%{query}%"))
+        return stmt
+
+    return statement
+
+
+for _name, _prefix in (
+    ("items_manage", "manage_item_"),
+    ("items_tastes", "manage_tastes_item_"),
+    ("items_delete", "delete_item_"),
+):
+    pagination.register(pagination.Picker(_name, _items_statement, _item_button(_prefix)))
+
+pagination.register(
+    pagination.Picker(
+        "categories_delete",
+        lambda context, query: select(Category.id, Category.name).order_by(
+            Category.name, Category.id
+        ),
+        _item_button("delete_category_"),
+    )
+)
+pagination.register(
+    pagination.Picker(
+        "tastes_remove",
+        _item_tastes_statement(attached=True),
+        lambda taste_id, name, item_id: InlineKeyboardButton(
+            text=f"❌ {name}", callback_data=f"taste_delete_{item_id}_{taste_id}"
+        ),
+        columns=2,
+    )
+)
+pagination.register(
+    pagination.Picker(
+        "tastes_add",
+        _item_tastes_statement(attached=False),
+        lambda taste_id, name, item_id: InlineKeyboardButton(
+            text=f"➕ {name}", callback_data=f"taste_add_{item_id}_{taste_id}"
+        ),
+        columns=2,
+        header=lambda item_id: [
+            InlineKeyboardButton(
+                text="🆕 Создать новый вкус", callback_data=f"create_new_taste_{item_id}"
+            )
+        ],
+    )
+)
+
+
+@dp.callback_query(pagination.PageCallback.filter())
+async def picker_page(callback: CallbackQuery, callback_data: pagination.PageCallback):
+    """Листание постраничных списков выбора"""
+    markup = await pagination.render_page(
+        callback_data.picker, callback_data.page, callback_data.context, callback_data.query
+    )
+    try:
+        await callback.message.edit_reply_markup(reply_markup=markup)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+    await callback.answer()
+
+
 @dp.callback_query(F.data == "noop")
 async def noop_callback(callback: CallbackQuery):
     """Обработчик для информационных кнопок, которые не должны выполнять действий"""
@@ -3454,6 +3593,9 @@ async def process_courier_car_model(message: Message, state: FSMContext):
                 await state.clear()
                 return
 
+            # Курьер мог еще не открывать бота: без строки users вставка нарушит FK
+            await users.ensure_user(session, data["user_id"], data["username"])
+
             # Создаем курьера
             courier = Courier(
                 user_id=data["user_id"],
@@ -3577,7 +3719,7 @@ async def show_admins(message: Message):
 
 @dp.message(F.text == "📋 Список курьеров")
 async def show_couriers(message: Message):
-    async with AsyncSessionLocal() as session:
+    async with ReadSessionLocal() as session:
         couriers = await session.execute(select(Courier).order_by(Courier.username))
         couriers = couriers.scalars().all()
 
@@ -3636,7 +3778,7 @@ async def process_category_image_document(message: Message, state: FSMContext):
 async def list_items(message: Message):
     """Получение списка товаров"""
     try:
-        async with AsyncSessionLocal() as session:
+        async with ReadSessionLocal() as session:
             items = (
                 (
                     await session.execute(
@@ -3653,6 +3795,8 @@ async def list_items(message: Message):
                 await message.answer("ℹ️ Список товаров пуст")
                 return
 
+            cached = await telegram_files.file_ids(session, (item.image for item in items))
+
             for item in items:
                 tastes = (
                     ", ".join([taste.name for taste in item.tastes])
@@ -3668,13 +3812,7 @@ async def list_items(message: Message):
                 )
 
                 if item.image:
-                    # Преобразуем относительный путь в полный путь для проверки существования файла
-                    full_image_path = os.path.join(os.getcwd(), item.image.lstrip("/"))
-                    if os.path.exists(full_image_path):
-                        photo = FSInputFile(full_image_path)
-                        await message.answer_photo(photo, caption=text)
-                    else:
-                        await message.answer(text)
+                    await answer_image(message, item.image, text, cached.get(item.image))
                 else:
                     await message.answer(text)
 
@@ -3687,26 +3825,24 @@ async def list_items(message: Message):
 async def list_categories(message: Message):
     """Получение списка категорий"""
     try:
-        async with AsyncSessionLocal() as session:
+        async with ReadSessionLocal() as session:
             categories = (await session.execute(select(Category))).scalars().all()
 
             if not categories:
                 await message.answer("ℹ️ Список категорий пуст")
                 return
 
+            cached = await telegram_files.file_ids(
+                session, (category.image for category in categories)
+            )
+
             for category in categories:
                 text = f"🏷️ {category.name}"
 
                 if category.image:
-                    # Преобразуем относительный путь в полный путь для проверки существования файла
-                    full_image_path = os.path.join(
-                        os.getcwd(), category.image.lstrip("/")
+                    await answer_image(
+                        message, category.image, text, cached.get(category.image)
                     )
-                    if os.path.exists(full_image_path):
-                        photo = FSInputFile(full_image_path)
-                        await message.answer_photo(photo, caption=text)
-                    else:
-                        await message.answer(text)
                 else:
                     await message.answer(text)
 
@@ -3719,27 +3855,11 @@ async def list_categories(message: Message):
 @dp.message(F.text == "❌ Удалить товар")
 async def delete_item_start(message: Message, state: FSMContext):
     """Начало процесса удаления товара"""
-    async with AsyncSessionLocal() as session:
-        items = await session.execute(select(Item))
-        items = items.scalars().all()
-
-        if not items:
-            await message.answer("ℹ️ Нет товаров для удаления")
-            return
-
-        builder = InlineKeyboardBuilder()
-        for item in items:
-            builder.add(
-                InlineKeyboardButton(
-                    text=f"{item.name} (ID: {item.id})",
-                    callback_data=f"delete_item_{item.id}",
-                )
-            )
-        builder.adjust(1)
-
-        await message.answer(
-            "Выберите товар для удаления:", reply_markup=builder.as_markup()
-        )
+    markup = await pagination.render_page("items_delete")
+    if markup is None:
+        await message.answer("ℹ️ Нет товаров для удаления")
+        return
+    await message.answer("Выберите товар для удаления:", reply_markup=markup)
 
 
 # Обработчик выбора товара для удаления
@@ -3780,12 +3900,8 @@ async def process_delete_item(callback: CallbackQuery, state: FSMContext):
                 await callback.answer("Товар не найден")
                 return
 
-            # Удаляем связи с вкусами
-            await session.execute(
-                delete(item_taste_association).where(
-                    item_taste_association.c.item_id == item_id
-                )
-            )
+            # Снимаем ссылки из заказов, корзин и связи с вкусами
+            await catalog.detach_item(session, item_id)
 
             # Удаляем сам товар
             await session.delete(item)
@@ -3804,27 +3920,11 @@ async def process_delete_item(callback: CallbackQuery, state: FSMContext):
 @dp.message(F.text == "❌ Удалить категорию")
 async def delete_category_start(message: Message, state: FSMContext):
     """Начало процесса удаления категории"""
-    async with AsyncSessionLocal() as session:
-        categories = await session.execute(select(Category))
-        categories = categories.scalars().all()
-
-        if not categories:
-            await message.answer("ℹ️ Нет категорий для удаления")
-            return
-
-        builder = InlineKeyboardBuilder()
-        for category in categories:
-            builder.add(
-                InlineKeyboardButton(
-                    text=f"{category.name} (ID: {category.id})",
-                    callback_data=f"delete_category_{category.id}",
-                )
-            )
-        builder.adjust(1)
-
-        await message.answer(
-            "Выберите категорию для удаления:", reply_markup=builder.as_markup()
-        )
+    markup = await pagination.render_page("categories_delete")
+    if markup is None:
+        await message.answer("ℹ️ Нет категорий для удаления")
+        return
+    await message.answer("Выберите категорию для удаления:", reply_markup=markup)
 
 
 # Обработчик выбора категории для удаления
@@ -3962,7 +4062,7 @@ async def process_promocode_percentage(message: Message, state: FSMContext):
 @dp.message(F.text == "📜 Список промокодов")
 async def list_promocodes(message: Message):
     """Отображение списка всех промокодов"""
-    async with AsyncSessionLocal() as session:
+    async with ReadSessionLocal() as session:
         promocodes = await session.execute(select(Promocode))
         promocodes = promocodes.scalars().all()
 
@@ -4333,11 +4433,15 @@ async def main():
     logger.info(f"BACKEND_URL: {os.getenv('BACKEND_URL')}")
     logger.info(f"Admins: {ADMINS}")
     logger.info(f"Couriers: {COURIERS}")
+    await writer.start()
     try:
         await dp.start_polling(bot)
     except Exception as e:
         logger.error(f"Bot error: {e}", exc_info=True)
         raise
+    finally:
+        await writer.stop()
+        await analytics.close()
 
 
 if __name__ == "__main__":
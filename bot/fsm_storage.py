@@ -0,0 +1,107 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import ReadSessionLocal, upsert
+from database.models import FsmState
+from database.writer import writer
+
+
+class DBStorage(BaseStorage):
+    """FSM в таблице fsm_states: переживает рестарт и общая для нескольких процессов бота.
+
+    Запись идет через writer (group commit вместе с остальными записями),
+    чтение — через читающий пул. Состояния, не менявшиеся дольше ttl,
+    считаются пустыми и удаляются не чаще раза в cleanup_interval.
+    """
+
+    def __init__(
+        self,
+        key_builder: Optional[KeyBuilder] = None,
+        ttl: Optional[timedelta] = None,
+        cleanup_interval: float = 3600,
+    ):
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.ttl = ttl or timedelta(hours=float(os.getenv("FSM_STATE_TTL_HOURS", "72")))
+        self.cleanup_interval = cleanup_interval
+        self._cleaned_at = 0.0
+
+    def _write(self, key: StorageKey, **values):
+        """Операция для writer: upsert только переданных колонок"""
+        row_key = self.key_builder.build(key)
+        now = datetime.utcnow()
+
+        async def op(session: AsyncSession):
+            stmt = upsert(session, FsmState).values(key=row_key, updated_at=now, **values)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["key"], set_={**values, "updated_at": now}
+                )
+            )
+            # Пустую запись (без состояния и данных) не храним
+            await session.execute(
+                delete(FsmState).where(
+                    FsmState.key == row_key, FsmState.state.is_(None), FsmState.data.is_(None)
+                )
+            )
+
+        return op
+
+    async def _submit(self, op):
+        await writer.submit(op)
+        if time.monotonic() - self._cleaned_at >= self.cleanup_interval:
+            self._cleaned_at = time.monotonic()
+            await writer.submit(self._cleanup())
+
+    def _cleanup(self):
+        cutoff = datetime.utcnow() - self.ttl
+
+        async def op(session: AsyncSession):
+            await session.execute(delete(FsmState).where(FsmState.updated_at < cutoff))
+
+        return op
+
+    async def _read(self, key: StorageKey) -> Optional[FsmState]:
+        async with ReadSessionLocal() as session:
+            row = await session.get(FsmState, self.key_builder.build(key))
+        if row is None or row.updated_at < datetime.utcnow() - self.ttl:
+            return None
+        return row
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._submit(self._write(key, state=state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._read(key)
+        return row.state if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._submit(self._write(key, data=dict(data) or None))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._read(key)
+        return dict(row.data) if row and row.data else {}
+
+    async def close(self) -> None:
+        pass
+
+
+def create_storage() -> BaseStorage:
+    """FSM_STORAGE=db (по умолчанию) или memory — для локальной отладки"""
+    if os.getenv("FSM_STORAGE", "db").lower() == "memory":
+        return MemoryStorage()
+    return DBStorage()
@@ -0,0 +1,47 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from services import metrics
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """Задержка и ошибки вызовов Bot API по методу (sendMessage, editMessageText...)"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            metrics.telegram_api_errors_total.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            metrics.telegram_api_duration.observe(time.perf_counter() - started, method=name)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Число и время обработки входящих апдейтов по типу (message, callback_query...)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        update_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            metrics.telegram_updates_total.inc(type=update_type, status=status)
+            metrics.telegram_update_duration.observe(
+                time.perf_counter() - started, type=update_type
+            )
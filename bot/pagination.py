@@ -0,0 +1,179 @@
+"""Постраничные inline-клавиатуры для выбора товара, категории и вкуса.
+
+Страница запрашивается из БД через LIMIT/OFFSET (LIMIT на одну строку больше —
+чтобы знать, есть ли следующая), готовая разметка кэшируется по версии
+каталога: любая фиксация изменений в items/categories/tastes/item_taste_association
+меняет версию, и старые страницы больше не используются.
+"""
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from database.db import ReadSessionLocal
+
+PAGE_SIZE = int(os.getenv("BOT_PAGE_SIZE", "20"))
+# Каталог могут менять и из другого процесса (API), поэтому страницы еще и стареют
+PAGE_CACHE_TTL = float(os.getenv("BOT_PAGE_CACHE_TTL", "60"))
+PAGE_CACHE_SIZE = int(os.getenv("BOT_PAGE_CACHE_SIZE", "512"))
+
+CATALOG_TABLES = {"items", "categories", "tastes", "item_taste_association"}
+
+
+class PageCallback(CallbackData, prefix="pg"):
+    picker: str
+    page: int = 0
+    context: int = 0  # например, id товара для выбора его вкусов
+    query: str = ""  # фильтр поиска
+
+
+@dataclass
+class Picker:
+    """statement(context, query) — select(id, name) с сортировкой;
+    button(id, name, context) — кнопка для строки; header(context) — кнопки над списком.
+    """
+
+    name: str
+    statement: Callable[[int, str], Select]
+    button: Callable[[int, str, int], InlineKeyboardButton]
+    columns: int = 1
+    header: Optional[Callable[[int], list[InlineKeyboardButton]]] = None
+
+
+PICKERS: dict[str, Picker] = {}
+
+
+def register(picker: Picker) -> Picker:
+    PICKERS[picker.name] = picker
+    return picker
+
+
+# ========================= Версия каталога =========================
+
+catalog_version = 0
+
+
+def _touches_catalog(statement) -> bool:
+    table = getattr(statement, "table", None)
+    return getattr(table, "name", None) in CATALOG_TABLES
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_catalog_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None and table.name in CATALOG_TABLES:
+            session.info["catalog_changed"] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_catalog_execute(orm_execute_state):
+    if not orm_execute_state.is_select and _touches_catalog(orm_execute_state.statement):
+        orm_execute_state.session.info["catalog_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_catalog_version(session):
+    global catalog_version
+    if session.info.pop("catalog_changed", False):
+        catalog_version += 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_catalog_change(session):
+    session.info.pop("catalog_changed", None)
+
+
+# ========================= Страницы =========================
+
+_pages: OrderedDict[tuple, tuple[Optional[InlineKeyboardMarkup], float]] = OrderedDict()
+
+
+def fit_query(picker: str, context: int, query: str) -> str:
+    """Обрезает фильтр так, чтобы callback_data навигации уложилась в 64 байта"""
+    query = query.replace(":", " ").strip()
+    while query:
+        try:
+            # pack() сам проверяет лимит в 64 байта
+            PageCallback(picker=picker, page=999, context=context, query=query).pack()
+            break
+        except ValueError:
+            query = query[:-1]
+    return query.strip()
+
+
+async def _render(picker: Picker, page: int, context: int, query: str):
+    async with ReadSessionLocal() as session:
+        rows = (
+            await session.execute(
+                picker.statement(context, query)
+                .limit(PAGE_SIZE + 1)
+                .offset(page * PAGE_SIZE)
+            )
+        ).all()
+    if not rows and page == 0:
+        return None
+
+    builder = InlineKeyboardBuilder()
+    if picker.header is not None:
+        builder.row(*picker.header(context))
+    for row_start in range(0, min(len(rows), PAGE_SIZE), picker.columns):
+        builder.row(
+            *(
+                picker.button(row_id, name, context)
+                for row_id, name in rows[row_start : min(row_start + picker.columns, PAGE_SIZE)]
+            )
+        )
+
+    navigation = []
+    if page > 0:
+        navigation.append(
+            InlineKeyboardButton(
+                text="◀️",
+                callback_data=PageCallback(
+                    picker=picker.name, page=page - 1, context=context, query=query
+                ).pack(),
+            )
+        )
+    if page > 0 or len(rows) > PAGE_SIZE:
+        navigation.append(InlineKeyboardButton(text=f"стр. {page + 1}", callback_data="noop"))
+    if len(rows) > PAGE_SIZE:
+        navigation.append(
+            InlineKeyboardButton(
+                text="▶️",
+                callback_data=PageCallback(
+                    picker=picker.name, page=page + 1, context=context, query=query
+                ).pack(),
+            )
+        )
+    if navigation:
+        builder.row(*navigation)
+    return builder.as_markup()
+
+
+async def render_page(
+    picker: str, page: int = 0, context: int = 0, query: str = ""
+) -> Optional[InlineKeyboardMarkup]:
+    """Клавиатура страницы; None — выбирать не из чего (пустая первая страница)"""
+    query = fit_query(picker, context, query)
+    key = (catalog_version, picker, page, context, query)
+    cached = _pages.get(key)
+    if cached is not None and time.monotonic() - cached[1] < PAGE_CACHE_TTL:
+        _pages.move_to_end(key)
+        return cached[0]
+
+    markup = await _render(PICKERS[picker], page, context, query)
+    _pages[key] = (markup, time.monotonic())
+    _pages.move_to_end(key)
+    while len(_pages) > PAGE_CACHE_SIZE:
+        _pages.popitem(last=False)
+    return markup
@@ -0,0 +1,23 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from database import query_budget
+
+
+class QueryBudgetUpdateMiddleware(BaseMiddleware):
+    """Считает SQL на апдейт бота и предупреждает о N+1 и превышении бюджета (dev)"""
+
+    def __init__(self, budget: int = query_budget.QUERY_BUDGET):
+        self.budget = budget
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        label = event.event_type if isinstance(event, Update) else type(event).__name__
+        with query_budget.track(f"update {label}", self.budget):
+            return await handler(event, data)
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+
+class TelegramRateLimiter:
+    """Темп исходящих вызовов Bot API: общий лимит в секунду и интервал на чат.
+
+    wait() резервирует ближайший свободный слот и спит до него,
+    поэтому пачка из десятков правок растягивается, а не упирается в 429.
+    chat_burst сообщений подряд в один чат уходят без паузы (Telegram
+    допускает короткие всплески), дальше — по одному в chat_interval.
+    """
+
+    def __init__(
+        self,
+        per_second: Optional[float] = None,
+        chat_interval: Optional[float] = None,
+        chat_burst: Optional[int] = None,
+    ):
+        per_second = per_second or float(os.getenv("TELEGRAM_RATE_PER_SECOND", "25"))
+        self.interval = 1 / per_second
+        self.chat_interval = (
+            chat_interval
+            if chat_interval is not None
+            else float(os.getenv("TELEGRAM_CHAT_INTERVAL_MS", "1000")) / 1000
+        )
+        self.chat_burst = chat_burst or int(os.getenv("TELEGRAM_CHAT_BURST", "20"))
+        self._next_at = 0.0
+        self._next_chat_at: dict[int, float] = {}
+
+    def _reserve_chat(self, chat_id: int) -> float:
+        now = time.monotonic()
+        # Слот по расписанию; первые chat_burst слотов разрешены заранее
+        scheduled = max(now, self._next_chat_at.get(chat_id, 0.0))
+        self._next_chat_at[chat_id] = scheduled + self.chat_interval
+        at = max(now, scheduled - (self.chat_burst - 1) * self.chat_interval)
+        if len(self._next_chat_at) > 1000:
+            # Чаты, у которых слот уже прошел, больше не ограничивают
+            self._next_chat_at = {
+                chat: ts for chat, ts in self._next_chat_at.items() if ts > now
+            }
+        return at - now
+
+    def _reserve_global(self) -> float:
+        now = time.monotonic()
+        at = max(now, self._next_at)
+        self._next_at = at + self.interval
+        return at - now
+
+    async def wait(self, chat_id: int):
+        # Сначала слот чата, потом общий: занятый чат не задерживает остальные
+        for reserve in (lambda: self._reserve_chat(chat_id), self._reserve_global):
+            delay = reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+
+limiter = TelegramRateLimiter()
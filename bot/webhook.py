@@ -0,0 +1,84 @@
+"""Режим webhook: Telegram шлет апдейты в /telegram/webhook/{secret} того же ASGI-приложения.
+
+BOT_MODE=webhook включает его вместо polling; тогда воркеров API может быть
+сколько угодно — каждый обрабатывает то, что Telegram прислал именно ему.
+"""
+import asyncio
+import hmac
+import logging
+import os
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL") or os.getenv("BACKEND_URL", "")
+WEBHOOK_PATH = "/telegram/webhook/{secret}"
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "32"))
+
+
+def webhook_enabled() -> bool:
+    return BOT_MODE == "webhook"
+
+
+def check_secret(path_secret: str, header_secret: Optional[str]) -> bool:
+    """Секрет в пути и X-Telegram-Bot-Api-Secret-Token, сравнение за постоянное время"""
+    if not WEBHOOK_SECRET:
+        return False
+    # Байты, а не str: compare_digest бросает TypeError на не-ASCII строках
+    secret = WEBHOOK_SECRET.encode()
+    return hmac.compare_digest(path_secret.encode(), secret) and hmac.compare_digest(
+        (header_secret or "").encode(), secret
+    )
+
+
+class UpdatePool:
+    """Ограниченный пул обработки апдейтов.
+
+    submit() ждет свободного места, если пул занят: ответ webhook задерживается,
+    и Telegram сам придерживает следующие апдейты (обратное давление).
+    """
+
+    def __init__(self, max_concurrency: int = WEBHOOK_MAX_CONCURRENCY):
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, dp: Dispatcher, bot: Bot, update: Update):
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(dp, bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, dp: Dispatcher, bot: Bot, update: Update):
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Ошибка обработки апдейта {update.update_id}: {e}", exc_info=True)
+        finally:
+            self._slots.release()
+
+    async def drain(self):
+        """Дожидается апдейтов, которые уже взяты в работу (при остановке)"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+pool = UpdatePool()
+
+
+async def setup_webhook(bot: Bot, dp: Dispatcher):
+    """Регистрирует webhook при старте; каждый воркер ставит тот же URL, это безопасно"""
+    if not WEBHOOK_SECRET or not WEBHOOK_BASE_URL:
+        raise Exception("BOT_MODE=webhook requires TELEGRAM_WEBHOOK_SECRET and WEBHOOK_BASE_URL")
+    url = WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH.format(secret=WEBHOOK_SECRET)
+    await bot.set_webhook(
+        url,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=WEBHOOK_MAX_CONCURRENCY,
+    )
+    logger.info("Telegram webhook set")
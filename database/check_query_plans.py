@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.models import (
+    Base,
+    Basket,
+    BasketItem,
+    Category,
+    Courier,
+    DBUser,
+    Item,
+    Order,
+    OrderArchive,
+    OrderItem,
+    OrderStatusEvent,
+    Taste,
+    item_taste_association,
+)
+from services import analytics, archive
+
+STATUSES = ["waiting_for_courier", "in_delivery", "delivered", "completed", "canceled"]
+
+
+def hot_queries() -> dict:
+    """Горячие запросы из app/main.py, bot/bot.py и services/ с типовыми параметрами"""
+    start_dt, end_dt = datetime(2026, 1, 1), datetime(2026, 2, 1)
+    return {
+        "api: заказы пользователя": select(Order)
+        .where(Order.user_id == 42)
+        .order_by(Order.created_at.desc()),
+        "api/bot: счетчик заказов клиента": select(func.count(Order.id)).where(
+            Order.user_id == 42
+        ),
+        "api: позиции корзины": select(BasketItem).where(BasketItem.basket_id == 7),
+        "api: позиция корзины по товару": select(BasketItem)
+        .where(BasketItem.basket_id == 7)
+        .where(BasketItem.item_id == 3),
+        "api: корзина пользователя": select(Basket).where(Basket.user_id == 42),
+        "api: позиции заказов (selectinload)": select(OrderItem).where(
+            OrderItem.order_id.in_([1, 2, 3])
+        ),
+        "api: товары категории": select(Item).where(Item.category_id == 2),
+        "api: проверка бана": select(DBUser.is_banned).where(DBUser.id == 42),
+        "bot: новые заказы": select(Order)
+        .where(Order.status == "waiting_for_courier")
+        .order_by(Order.created_at.asc()),
+        "bot: активные заказы курьера": select(Order)
+        .where(
+            (Order.courier_id == 5)
+            & (
+                (Order.status == "in_delivery")
+                | (Order.status == "delivered")
+                | (Order.status == "waiting_for_courier")
+            )
+        )
+        .order_by(Order.status, Order.created_at.desc()),
+        "bot: завершенные заказы": select(Order)
+        .where(Order.status == "completed")
+        .order_by(Order.created_at.desc())
+        .limit(100),
+        "bot: завершенные заказы курьера": select(Order)
+        .where((Order.status == "completed") & (Order.courier_id == 5))
+        .order_by(Order.created_at.desc())
+        .limit(50),
+        "bot: курьер по пользователю": select(Courier).where(Courier.user_id == 42),
+        "bot: забаненные пользователи": select(DBUser).where(DBUser.is_banned == True),
+        "bot: связь товар-вкус": select(item_taste_association).where(
+            item_taste_association.c.item_id == 3,
+            item_taste_association.c.taste_id == 4,
+        ),
+        "analytics: продажи": select(Order)
+        .where(Order.created_at >= start_dt)
+        .where(Order.created_at < end_dt)
+        .where(Order.status.in_(analytics.PAID_STATUSES))
+        .order_by(Order.created_at.desc()),
+        "analytics: топ товаров": analytics._top_sales_filters(
+            select(OrderItem.item_id, func.sum(OrderItem.quantity)),
+            start_dt,
+            end_dt,
+            None,
+        ).group_by(OrderItem.item_id),
+        "analytics: события этапа доставки": select(OrderStatusEvent.order_id)
+        .where(OrderStatusEvent.to_status == "in_delivery")
+        .where(OrderStatusEvent.at >= start_dt)
+        .where(OrderStatusEvent.at < end_dt),
+        "analytics: журнал статусов заказов": select(OrderStatusEvent)
+        .where(OrderStatusEvent.order_id.in_([1, 2, 3]))
+        .order_by(OrderStatusEvent.order_id, OrderStatusEvent.at),
+        "archive: пачка на перенос": select(Order.id)
+        .where(Order.status.in_(archive.ARCHIVE_STATUSES))
+        .where(Order.created_at < start_dt)
+        .where(Order.id < select(func.max(Order.id)).scalar_subquery())
+        .order_by(Order.created_at)
+        .limit(archive.ARCHIVE_BATCH_SIZE),
+        "archive: граница архива": select(func.max(OrderArchive.created_at)),
+        "archive: заказы пользователя": select(OrderArchive)
+        .where(OrderArchive.user_id == 42)
+        .order_by(OrderArchive.created_at.desc()),
+    }
+
+
+def seed(conn, orders: int = 2000):
+    """Заполняет базу данными, похожими на боевые, и собирает статистику"""
+    rnd = random.Random(0)
+    now = datetime(2026, 1, 1)
+    conn.execute(
+        insert(DBUser),
+        [{"id": i, "username": f"user{i}", "is_banned": i % 97 == 0} for i in range(1, 501)],
+    )
+    conn.execute(
+        insert(Courier),
+        [{"id": i, "user_id": i, "phone": "+375000000000"} for i in range(1, 11)],
+    )
+    conn.execute(insert(Category), [{"id": i, "name": f"category{i}"} for i in range(10)])
+    conn.execute(insert(Taste), [{"id": i, "name": f"taste{i}"} for i in range(1, 6)])
+    conn.execute(
+        insert(Item),
+        [{"id": i, "name": f"item{i}", "price": 10, "category_id": i % 10} for i in range(1, 201)],
+    )
+    conn.execute(
+        insert(item_taste_association),
+        [{"item_id": i, "taste_id": t} for i in range(1, 201) for t in range(1, 6)],
+    )
+    conn.execute(insert(Basket), [{"id": i, "user_id": i} for i in range(1, 501)])
+    conn.execute(
+        insert(BasketItem),
+        [
+            {"basket_id": rnd.randint(1, 500), "item_id": rnd.randint(1, 200), "price": 10}
+            for _ in range(1000)
+        ],
+    )
+    conn.execute(
+        insert(Order),
+        [
+            {
+                "id": i,
+                "user_id": rnd.randint(1, 500),
+                "courier_id": rnd.randint(1, 10),
+                "payment": "cash",
+                "delivery": "courier",
+                "total_price": 20,
+                "status": rnd.choice(STATUSES),
+                "created_at": now - timedelta(minutes=30 * i),
+            }
+            for i in range(1, orders + 1)
+        ],
+    )
+    conn.execute(
+        insert(OrderItem),
+        [
+            {
+                "order_id": rnd.randint(1, orders),
+                "item_id": rnd.randint(1, 200),
+                "name": "item",
+                "quantity": 2,
+                "price_per_item": 10,
+                "total_price": 20,
+                "selected_taste": "mint",
+            }
+            for _ in range(orders * 2)
+        ],
+    )
+    conn.execute(text("ANALYZE"))
+
+
+def full_scans(conn, stmt) -> list[str]:
+    """Строки плана с полным проходом по таблице (SQLite или PostgreSQL)"""
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql(f"EXPLAIN {sql}").scalars().all()
+        return [line.strip() for line in plan if "Seq Scan" in line]
+    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    return [row[-1] for row in plan if row[-1].startswith("SCAN ") and " USING " not in row[-1]]
+
+
+def plan_report(conn) -> dict[str, list[str]]:
+    """Заполняет базу и возвращает полные проходы по каждому горячему запросу (пусто — ок)"""
+    if conn.dialect.name == "postgresql":
+        # На маленькой выборке PostgreSQL и так предпочтет Seq Scan; с выключенным
+        # seqscan он останется в плане только там, где подходящего индекса нет
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    seed(conn)
+    return {name: full_scans(conn, stmt) for name, stmt in hot_queries().items()}
+
+
+def check(conn) -> int:
+    failed = 0
+    for name, scans in plan_report(conn).items():
+        if scans:
+            failed += 1
+            print(f"❌ {name}: {'; '.join(scans)}")
+        else:
+            print(f"✅ {name}")
+    # Данные проверки не сохраняем
+    conn.rollback()
+    return failed
+
+
+async def main(url: str) -> int:
+    """Проверка планов горячих запросов: python -m database.check_query_plans [--url ...]"""
+    engine = create_async_engine(url)
+    async with engine.connect() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        failed = await conn.run_sync(check)
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--url",
+        default="sqlite+aiosqlite://",
+        help="пустая тестовая база, например postgresql+asyncpg://...",
+    )
+    sys.exit(asyncio.run(main(parser.parse_args().url)))
@@ -1,13 +1,17 @@
 from datetime import datetime
 
 from sqlalchemy import (
-    JSON,
+    BigInteger,
     Boolean,
     Column,
+    Date,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
+    PrimaryKeyConstraint,
     String,
     Table,
 )
@@ -15,12 +19,16 @@ from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
+# Telegram id не помещается в int4 PostgreSQL; в SQLite INTEGER и так 64-битный,
+# а BIGINT PRIMARY KEY там перестал бы быть псевдонимом rowid
+TelegramId = BigInteger().with_variant(Integer, "sqlite")
+
 
 class Basket(Base):
     __tablename__ = "baskets"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), unique=True)
+    user_id = Column(TelegramId, ForeignKey("users.id"), unique=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     total_price = Column(Float, default=0.0)
 
@@ -32,6 +40,7 @@ class Basket(Base):
 
 class BasketItem(Base):
     __tablename__ = "basket_items"
+    __table_args__ = (Index("ix_basket_items_basket_id_item_id", "basket_id", "item_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     basket_id = Column(Integer, ForeignKey("baskets.id"))
@@ -57,6 +66,7 @@ item_taste_association = Table(
     Base.metadata,
     Column("item_id", Integer, ForeignKey("items.id")),
     Column("taste_id", Integer, ForeignKey("tastes.id")),
+    Index("ix_item_taste_association_item_id_taste_id", "item_id", "taste_id"),
 )
 
 
@@ -67,7 +77,7 @@ class Item(Base):
     name = Column(String, nullable=False)
     description = Column(String)
     price = Column(Integer)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     image = Column(String)
     
     # Характеристики
@@ -76,6 +86,9 @@ class Item(Base):
     vg_pg = Column(String, nullable=True)  # VG/PG соотношение (например: "50/50", "70/30")
     tank_volume = Column(String, nullable=True)  # Объем бака (например: "2 мл", "3.5 мл")
 
+    # Продано штук в завершенных заказах, обновляется при завершении заказа
+    popularity_score = Column(Integer, default=0, index=True)
+
     # Связи
     category = relationship("Category", back_populates="items")
     tastes = relationship("Taste", secondary=item_taste_association)
@@ -94,12 +107,12 @@ class Category(Base):
 
 class DBUser(Base):
     __tablename__ = "users"
-    id = Column(Integer, primary_key=True, index=True)
-    telegram_id = Column(Integer, unique=True, index=True, nullable=True)
+    id = Column(TelegramId, primary_key=True, index=True)
+    telegram_id = Column(TelegramId, unique=True, index=True, nullable=True)
     username = Column(String, index=True)
     point = Column(Integer, default=0)
     basket = relationship("Basket", back_populates="user", uselist=False)
-    is_banned = Column(Boolean, default=False)
+    is_banned = Column(Boolean, default=False, index=True)
     
     # Loyalty program fields
     stamps = Column(Integer, default=0)  # Current stamps (0-5)
@@ -116,6 +129,11 @@ class DBUser(Base):
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = (
+        # Покрывающие индексы для отчетов по топу товаров и вкусов
+        Index("ix_order_items_order_item_sales", "order_id", "item_id", "quantity", "total_price"),
+        Index("ix_order_items_order_taste_sales", "order_id", "selected_taste", "quantity", "total_price"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
@@ -135,7 +153,7 @@ class Courier(Base):
     __tablename__ = "couriers"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    user_id = Column(TelegramId, ForeignKey("users.id"), unique=True, nullable=False)
     username = Column(String)
     phone = Column(String, nullable=False)
     car_model = Column(String)
@@ -148,9 +166,14 @@ class Courier(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_courier_id_status_created_at", "courier_id", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(TelegramId, ForeignKey("users.id"), nullable=False)
     username = Column(String, nullable=True)
     basket_id = Column(Integer, ForeignKey("baskets.id"), nullable=True)
     payment = Column(String, nullable=False)
@@ -167,7 +190,6 @@ class Order(Base):
     promocode = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="waiting_for_courier")
-    bot_message_ids = Column(JSON, default=list)
     courier_id = Column(
         Integer, ForeignKey("couriers.id")
     )
@@ -185,11 +207,112 @@ class Order(Base):
     basket = relationship("Basket", back_populates="orders")
 
 
+class OrderArchive(Base):
+    """Завершенные и отмененные заказы старше ORDER_ARCHIVE_AFTER_DAYS.
+
+    Колонки повторяют orders (id сохраняется), переносит services/archive.py.
+    """
+
+    __tablename__ = "orders_archive"
+    __table_args__ = (
+        Index("ix_orders_archive_status_created_at", "status", "created_at"),
+        Index("ix_orders_archive_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(TelegramId, nullable=False)
+    username = Column(String, nullable=True)
+    basket_id = Column(Integer, nullable=True)
+    payment = Column(String, nullable=False)
+    delivery = Column(String, nullable=False)
+    address = Column(String, nullable=True)
+    telephone = Column(String, nullable=True)
+    metro_line = Column(String, nullable=True)
+    metro_station = Column(String, nullable=True)
+    preferred_time = Column(String, nullable=True)
+    time_slot = Column(String, nullable=True)
+    delivery_cost = Column(Float, default=0.0)
+    total_price = Column(Float, nullable=False)
+    discount = Column(Integer, default=0)
+    promocode = Column(String, nullable=True)
+    created_at = Column(DateTime, index=True)
+    status = Column(String)
+    courier_id = Column(Integer)
+    postal_full_name = Column(String, nullable=True)
+    postal_phone = Column(String, nullable=True)
+    postal_address = Column(String, nullable=True)
+    postal_index = Column(String, nullable=True)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    items = relationship("OrderItemArchive", back_populates="order")
+
+
+class OrderItemArchive(Base):
+    __tablename__ = "order_items_archive"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), index=True)
+    item_id = Column(Integer)
+    name = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    price_per_item = Column(Float, nullable=False)
+    total_price = Column(Float, nullable=False)
+    tastes = Column(String)
+    selected_taste = Column(String)
+
+    order = relationship("OrderArchive", back_populates="items")
+
+
+class OrderMessage(Base):
+    """Сообщение бота о заказе в конкретном чате — чтобы удалять и править адресно.
+
+    Без внешнего ключа на orders: строки удаляются вместе с сообщениями.
+    """
+
+    __tablename__ = "order_messages"
+    __table_args__ = (
+        Index(
+            "ix_order_messages_order_id_chat_id_message_id",
+            "order_id",
+            "chat_id",
+            "message_id",
+            unique=True,
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, nullable=False)
+    chat_id = Column(TelegramId, nullable=False)
+    message_id = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # new_order | card | cancel_prompt
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class OrderStatusEvent(Base):
+    """Журнал смен статуса заказа (только добавление).
+
+    Без внешнего ключа на orders: события должны переживать перенос заказов в архив.
+    """
+
+    __tablename__ = "order_status_events"
+    __table_args__ = (
+        Index("ix_order_status_events_order_id_at", "order_id", "at"),
+        Index("ix_order_status_events_to_status_at", "to_status", "at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, nullable=False)
+    from_status = Column(String, nullable=True)  # None — заказ создан
+    to_status = Column(String, nullable=False)
+    actor = Column(String, nullable=True)  # tg:<telegram_id> | api
+    at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
 class OrderHistory(Base):
     __tablename__ = "orders_history"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(TelegramId, ForeignKey("users.id"), nullable=False)
     item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -201,3 +324,42 @@ class Promocode(Base):
     name = Column(String, nullable=False)
     percentage = Column(Integer, nullable=False)
     is_active = Column(Boolean)
+
+
+class DailySales(Base):
+    """Дневной агрегат заказов, обновляется при каждой смене статуса заказа"""
+
+    __tablename__ = "daily_sales"
+    __table_args__ = (PrimaryKeyConstraint("day", "status", "delivery", "payment"),)
+
+    day = Column(Date, nullable=False)
+    status = Column(String, nullable=False)
+    delivery = Column(String, nullable=False)
+    payment = Column(String, nullable=False)
+    orders_count = Column(Integer, nullable=False, default=0)
+    items_count = Column(Integer, nullable=False, default=0)
+    gross = Column(Float, nullable=False, default=0.0)
+    discount = Column(Float, nullable=False, default=0.0)
+    delivery_cost = Column(Float, nullable=False, default=0.0)
+
+
+class TelegramFile(Base):
+    """file_id, под которым Telegram уже хранит картинку из uploads/ (по пути файла)"""
+
+    __tablename__ = "telegram_files"
+
+    path = Column(String, primary_key=True)  # /uploads/<имя>, как в Item.image
+    file_id = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class FsmState(Base):
+    """Состояние FSM бота (aiogram) на ключ чат/пользователь — переживает рестарт"""
+
+    __tablename__ = "fsm_states"
+    __table_args__ = (Index("ix_fsm_states_updated_at", "updated_at"),)
+
+    key = Column(String, primary_key=True)  # bot_id:chat_id:user_id:destiny
+    state = Column(String, nullable=True)
+    data = Column(JSON(none_as_null=True), nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,131 @@
+"""Учет SQL-запросов в рамках HTTP-запроса или апдейта бота: бюджет и поиск N+1.
+
+Включается явно: QUERY_BUDGET > 0 (по умолчанию выключен). Одинаковые по
+форме запросы, повторенные QUERY_REPEAT_THRESHOLD и более раз, считаются
+признаком N+1. При превышении бюджета — предупреждение в лог или исключение
+(QUERY_BUDGET_MODE=raise).
+
+    with assert_max_queries(3):
+        await get_user_orders(...)
+
+В тестах то же самое дает фикстура assert_max_queries из tests/conftest.py.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "0"))
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log").lower()
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "3"))
+ENABLED = QUERY_BUDGET > 0
+
+# Списки параметров IN (?, ?, ?) сворачиваются, чтобы пачки разной длины считались одной формой
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*,?)+\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    return _PARAM_LIST.sub("(…)", _SPACES.sub(" ", statement).strip())
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    def __init__(self, label: str, budget: int = 0):
+        self.label = label
+        self.budget = budget
+        self.shapes: Counter[str] = Counter()
+
+    @property
+    def count(self) -> int:
+        return sum(self.shapes.values())
+
+    def record(self, statement: str):
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD) -> list[tuple[str, int]]:
+        """Формы запросов, выполненные threshold и более раз"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.label}: {self.count} SQL (бюджет {self.budget or '—'})"]
+        for shape, n in self.repeated() or self.shapes.most_common(5):
+            lines.append(f"  {n}× {shape[:300]}")
+        return "\n".join(lines)
+
+
+_current: ContextVar[Optional[QueryRecorder]] = ContextVar("query_recorder", default=None)
+# Записывают все запросы процесса — для тестов, где запрос выполняется в другом потоке/задаче
+_global: list[QueryRecorder] = []
+_instrumented: set[int] = set()
+
+
+def instrument_engine(async_engine):
+    """Подключает учет к движку; повторный вызов ничего не делает"""
+    sync_engine = async_engine.sync_engine
+    if id(sync_engine) in _instrumented:
+        return
+    _instrumented.add(id(sync_engine))
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        recorder = _current.get()
+        if recorder is not None:
+            recorder.record(statement)
+            if (
+                QUERY_BUDGET_MODE == "raise"
+                and recorder.budget
+                and recorder.count > recorder.budget
+            ):
+                raise QueryBudgetExceeded(recorder.report())
+        for recorder in _global:
+            recorder.record(statement)
+
+
+def instrument_default_engines():
+    from database.db import engine, read_engine
+
+    instrument_engine(engine)
+    instrument_engine(read_engine)
+
+
+@contextmanager
+def track(label: str, budget: Optional[int] = None):
+    """Учет запросов текущего контекста (задачи); по выходу — лог N+1 и бюджета"""
+    recorder = QueryRecorder(label, QUERY_BUDGET if budget is None else budget)
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+        if recorder.budget and recorder.count > recorder.budget:
+            logger.warning("Превышен бюджет SQL-запросов\n%s", recorder.report())
+        elif recorder.repeated():
+            logger.warning("Похоже на N+1\n%s", recorder.report())
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = "assert_max_queries"):
+    """AssertionError, если внутри блока выполнено больше limit запросов.
+
+    Считает все запросы процесса, поэтому работает и с TestClient,
+    где приложение исполняется в отдельном потоке.
+    """
+    instrument_default_engines()
+    recorder = QueryRecorder(label, limit)
+    _global.append(recorder)
+    try:
+        yield recorder
+    finally:
+        _global.remove(recorder)
+    assert recorder.count <= limit, recorder.report()
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from database.db import AsyncSessionLocal, engine
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+WriteOp = Callable[[AsyncSession], Awaitable[T]]
+
+
+class WriteCoordinator:
+    """Единственный писатель SQLite: мелкие изменения идут через одно соединение
+    и фиксируются пачками (group commit) раз в несколько миллисекунд.
+
+    Операция — async-функция от сессии. Она не должна делать commit сама
+    и не должна иметь побочных эффектов вне БД: при ошибке в пачке
+    операции переигрываются по одной. Возвращать лучше простые значения,
+    а не ORM-объекты: сессия очищается после каждой пачки.
+    """
+
+    def __init__(
+        self,
+        db_engine: AsyncEngine = engine,
+        max_batch: Optional[int] = None,
+        max_delay: Optional[float] = None,
+    ):
+        self.engine = db_engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self.running:
+            return
+        if self.max_batch is None:
+            self.max_batch = int(os.getenv("WRITE_BATCH_MAX_SIZE", "64"))
+        if self.max_delay is None:
+            self.max_delay = float(os.getenv("WRITE_BATCH_MAX_DELAY_MS", "5")) / 1000
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дописывает уже поставленные операции и закрывает соединение"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, op: WriteOp) -> T:
+        """Выполняет операцию в ближайшей пачке и возвращает ее результат"""
+        if not self.running:
+            # Писатель не запущен (скрипты, отдельный процесс): обычная транзакция
+            async with AsyncSessionLocal() as session:
+                result = await op(session)
+                await session.commit()
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        first = await self._queue.get()
+        if first is None:
+            self._stopping = True
+            return []
+        # Даем соседним запросам несколько миллисекунд попасть в ту же пачку
+        await asyncio.sleep(self.max_delay)
+        batch = [first]
+        while len(batch) < self.max_batch and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is None:
+                self._stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        try:
+            async with self.engine.connect() as conn:
+                async with AsyncSession(bind=conn, expire_on_commit=False) as session:
+                    while not self._stopping:
+                        batch = await self._collect()
+                        if batch:
+                            started = time.perf_counter()
+                            for _, _, enqueued_at in batch:
+                                metrics.db_write_queue_wait.observe(started - enqueued_at)
+                            metrics.db_write_batch_size.observe(len(batch))
+                            await self._execute_batch(session, batch)
+        finally:
+            # Не оставляем ожидающих, если писатель упал или был отменен
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None and not item[1].done():
+                    item[1].set_exception(RuntimeError("Write coordinator stopped"))
+
+    async def _execute_batch(self, session: AsyncSession, batch: list):
+        results = []
+        try:
+            for op, _, _ in batch:
+                results.append(await op(session))
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+            else:
+                logger.warning("Write batch of %s failed, replaying one by one", len(batch))
+                for op, future, _ in batch:
+                    await self._execute_one(session, op, future)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            session.expunge_all()
+
+    async def _execute_one(self, session: AsyncSession, op: WriteOp, future: asyncio.Future):
+        try:
+            result = await op(session)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+
+writer = WriteCoordinator()
+metrics.register_gauge(
+    "db_write_queue_depth",
+    "Writes waiting for the single writer (outbox depth)",
+    lambda: writer.queue_depth,
+)
@@ -1,52 +1,116 @@
+import asyncio
+import os
 import time
+from collections import OrderedDict
+from typing import Optional
 
-from fastapi import Request
 from fastapi.responses import JSONResponse
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from starlette.types import ASGIApp, Receive, Scope, Send
 
-from database.db import AsyncSessionLocal
+from database.db import ReadSessionLocal
 from database.models import DBUser
+from middlewares.bypass import get_header, is_static_request
 
 
-class BannedUserMiddleware:
-    """Safe ASGI middleware for banning users."""
+class BanCache:
+    """Кэш флага бана.
 
-    def __init__(self, app: ASGIApp, cache_ttl: int = 60):
-        self.app = app
-        self.cache_ttl = cache_ttl
-        self.banned_cache: dict[str, tuple[bool, float]] = {}
+    Основной режим — полный набор забаненных в памяти (он маленький): проверка
+    без обращения к БД, набор перечитывается одним запросом раз в ttl.
+    Если забаненных больше max_size, работает ограниченный LRU с TTL
+    по отдельным пользователям, и сессия открывается только на промах.
+    Бан и разбан в боте сразу обновляют кэш своего процесса через invalidate();
+    остальные воркеры API видят изменение после перечитывания, поэтому ttl
+    короткий — перечитать маленький набор одним запросом дешево.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_size: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("BAN_CACHE_TTL", "10"))
+        self.max_size = max_size or int(os.getenv("BAN_CACHE_MAX_SIZE", "10000"))
+        self._banned: Optional[set[int]] = None
+        self._snapshot_at = 0.0
+        self._entries: OrderedDict[int, tuple[bool, float]] = OrderedDict()
+        self._refresh_lock = asyncio.Lock()
+
+    async def preload(self):
+        """Загружает полный набор забаненных (при старте и по истечении ttl)"""
+        async with ReadSessionLocal() as session:
+            ids = (
+                await session.scalars(
+                    select(DBUser.id).where(DBUser.is_banned == True).limit(self.max_size + 1)
+                )
+            ).all()
+        self._banned = set(ids) if len(ids) <= self.max_size else None
+        self._snapshot_at = time.monotonic()
+
+    def invalidate(self, user_id: int, is_banned: Optional[bool] = None):
+        """Сразу применяет бан/разбан; is_banned=None — просто забыть пользователя"""
+        self._entries.pop(user_id, None)
+        if is_banned is None:
+            return
+        self._remember(user_id, is_banned)
+        if self._banned is not None:
+            if is_banned:
+                self._banned.add(user_id)
+            else:
+                self._banned.discard(user_id)
+
+    def _remember(self, user_id: int, is_banned: bool):
+        self._entries[user_id] = (is_banned, time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def is_banned(self, user_id: int) -> bool:
+        now = time.monotonic()
+        if self._banned is not None:
+            if now - self._snapshot_at >= self.ttl:
+                async with self._refresh_lock:
+                    # Параллельные запросы ждут одно перечитывание
+                    if time.monotonic() - self._snapshot_at >= self.ttl:
+                        await self.preload()
+            if self._banned is not None:
+                return user_id in self._banned
 
-    async def _is_banned_cached(self, user_id: str, db: AsyncSession) -> bool:
-        now = time.time()
-        cached = self.banned_cache.get(user_id)
-        if cached and now - cached[1] < self.cache_ttl:
+        cached = self._entries.get(user_id)
+        if cached and now - cached[1] < self.ttl:
+            self._entries.move_to_end(user_id)
             return cached[0]
 
-        result = await db.execute(select(DBUser.is_banned).where(DBUser.id == user_id))
-        row = result.scalar_one_or_none()
-        is_banned = bool(row)
-        self.banned_cache[user_id] = (is_banned, now)
-        print(result)
+        async with ReadSessionLocal() as session:
+            is_banned = bool(
+                await session.scalar(select(DBUser.is_banned).where(DBUser.id == user_id))
+            )
+        self._remember(user_id, is_banned)
         return is_banned
 
+
+ban_cache = BanCache()
+
+
+class BannedUserMiddleware:
+    """Safe ASGI middleware for banning users."""
+
+    def __init__(self, app: ASGIApp, cache: BanCache = ban_cache):
+        self.app = app
+        self.cache = cache
+
     async def __call__(self, scope: Scope, receive: Receive, send: Send):
         # ⚠️ Handle only HTTP — skip lifespan/websocket for safety
-        if scope["type"] != "http":
+        if scope["type"] != "http" or is_static_request(scope):
             await self.app(scope, receive, send)
             return
 
-        request = Request(scope, receive=receive)
-        user_id = request.headers.get("X-User-ID")
-
-        if user_id:
-            async with AsyncSessionLocal() as session:
-                if await self._is_banned_cached(user_id, session):
-                    response = JSONResponse(
-                        status_code=403, content={"detail": "User is banned"}
-                    )
-                    await response(scope, receive, send)
-                    return
+        # Заголовок читаем прямо из scope, без сборки Request
+        user_id = get_header(scope, b"x-user-id")
+
+        if user_id and user_id.lstrip(b"-").isdigit():
+            if await self.cache.is_banned(int(user_id)):
+                response = JSONResponse(
+                    status_code=403, content={"detail": "User is banned"}
+                )
+                await response(scope, receive, send)
+                return
 
         await self.app(scope, receive, send)
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Файлы фронтенда и загрузки: им не нужны ни CORS, ни проверка бана
+STATIC_PREFIXES = ("/assets/", "/uploads/")
+# Имена маршрутов app/main.py, которые отдают index.html фронтенда
+SPA_ROUTES = {"root", "spa_fallback"}
+SPA_PATHS_CACHE_SIZE = 4096
+
+_spa_paths: OrderedDict[tuple, bool] = OrderedDict()
+
+
+def get_header(scope: Scope, name: bytes) -> Optional[bytes]:
+    """Значение заголовка из сырого scope (name в нижнем регистре) без сборки Request"""
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def is_static_request(scope: Scope) -> bool:
+    """Статика или переход по страницам SPA (маршруты из SPA_ROUTES).
+
+    Решение принимается только по пути: заголовки задает клиент, и по ним
+    забаненный пользователь мог бы обойти проверку бана.
+    """
+    if scope["path"].startswith(STATIC_PREFIXES):
+        return True
+    app = scope.get("app")
+    if scope["method"] not in ("GET", "HEAD") or app is None:
+        return False
+    return _is_spa_path(app.router, scope["path"])
+
+
+def _is_spa_path(router, path: str) -> bool:
+    """Первый подходящий GET-маршрут для пути — страница SPA, а не API"""
+    key = (id(router), path)
+    cached = _spa_paths.get(key)
+    if cached is not None:
+        _spa_paths.move_to_end(key)
+        return cached
+
+    probe = {"type": "http", "method": "GET", "path": path, "root_path": ""}
+    is_spa = False
+    for route in router.routes:
+        match, _ = route.matches(probe)
+        if match == Match.FULL:
+            is_spa = getattr(route, "name", None) in SPA_ROUTES
+            break
+
+    _spa_paths[key] = is_spa
+    while len(_spa_paths) > SPA_PATHS_CACHE_SIZE:
+        _spa_paths.popitem(last=False)
+    return is_spa
+
+
+class SkipStaticMiddleware:
+    """Оборачивает middleware так, что статика и навигация SPA идут мимо него.
+
+    app.add_middleware(SkipStaticMiddleware, middleware=CORSMiddleware, allow_origins=[...])
+    """
+
+    def __init__(self, app: ASGIApp, middleware, **options):
+        self.app = app
+        self.wrapped = middleware(app, **options)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and is_static_request(scope):
+            await self.app(scope, receive, send)
+            return
+        await self.wrapped(scope, receive, send)
@@ -0,0 +1,54 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from middlewares.bypass import is_static_request
+from services import metrics
+
+
+def _route_label(scope: Scope) -> str:
+    # Шаблон маршрута FastAPI кладет в scope при сопоставлении: /users/{user_id}/orders/
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "<unknown>")
+    return "<static>" if is_static_request(scope) else "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Задержка и статус по шаблону маршрута, запросы в работе и SQL на запрос"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = metrics.RequestStats()
+        token = metrics.request_stats.set(stats)
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.http_requests_in_flight.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.http_requests_in_flight.dec(method=method)
+            metrics.request_stats.reset(token)
+            route = _route_label(scope)
+            metrics.http_requests_total.inc(method=method, route=route, status=status_code)
+            metrics.http_request_duration.observe(
+                elapsed, method=method, route=route, status=status_code
+            )
+            if route != "<static>":
+                metrics.db_queries_per_request.observe(stats.queries, route=route)
+                metrics.db_time_per_request.observe(stats.db_time, route=route)
@@ -0,0 +1,26 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from database import query_budget
+from middlewares.bypass import is_static_request
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL на HTTP-запрос и предупреждает о N+1 и превышении бюджета (dev)"""
+
+    def __init__(self, app: ASGIApp, budget: int = query_budget.QUERY_BUDGET):
+        self.app = app
+        self.budget = budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or is_static_request(scope):
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']} {scope['path']}"
+        with query_budget.track(label, self.budget) as recorder:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    recorder.label = f"{scope['method']} {route.path}"
@@ -0,0 +1,134 @@
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from database.writer import writer
+from middlewares.bypass import get_header
+from services import metrics
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Апдейты Telegram приходят с его IP пачками; их темп ограничивает пул webhook
+EXEMPT_PREFIXES = ("/telegram/webhook/",)
+
+# (группа, шаблон пути, токенов в секунду, емкость корзины); первое совпадение выигрывает
+WRITE_LIMITS = (
+    ("order", re.compile(r"^/orders/from_basket/"), 0.2, 3),
+    ("basket", re.compile(r"^/basket/"), 5.0, 20),
+    ("write", re.compile(r"^/"), 10.0, 30),
+)
+
+
+class TokenBucketLimiter:
+    """Корзины токенов по ключу (пользователь или IP + группа маршрутов).
+
+    Ключей ограниченное число: самые давно не использованные вытесняются,
+    их корзина при следующем запросе начнется полной.
+    """
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys or int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+        self._buckets: OrderedDict[tuple, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: tuple, rate: float, burst: int) -> float:
+        """Забирает токен; 0 — можно, иначе через сколько секунд появится токен"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            retry_after = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            retry_after = (1 - tokens) / rate
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+def client_key(scope: Scope) -> str:
+    """X-User-ID из Telegram WebApp, без него — IP клиента"""
+    user_id = get_header(scope, b"x-user-id")
+    if user_id and user_id.lstrip(b"-").isdigit():
+        return f"user:{int(user_id)}"
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+class RateLimitMiddleware:
+    """Лимит пишущих запросов на пользователя и сброс нагрузки.
+
+    429 — пользователь исчерпал свою корзину для группы маршрутов;
+    503 — слишком много пишущих запросов одновременно или очередь
+    writer переполнена. Оба ответа с Retry-After, отказы — в метриках.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: Optional[TokenBucketLimiter] = None,
+        max_in_flight: Optional[int] = None,
+        max_queue_depth: Optional[int] = None,
+    ):
+        self.app = app
+        self.limiter = limiter or TokenBucketLimiter()
+        self.max_in_flight = max_in_flight or int(os.getenv("WRITE_MAX_IN_FLIGHT", "64"))
+        self.max_queue_depth = max_queue_depth or int(
+            os.getenv("WRITE_SHED_QUEUE_DEPTH", "256")
+        )
+        self.in_flight = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in WRITE_METHODS
+            or scope["path"].startswith(EXEMPT_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        group, rate, burst = next(
+            (group, rate, burst)
+            for group, pattern, rate, burst in WRITE_LIMITS
+            if pattern.match(scope["path"])
+        )
+
+        if self.in_flight >= self.max_in_flight or writer.queue_depth >= self.max_queue_depth:
+            reason = "concurrency" if self.in_flight >= self.max_in_flight else "queue"
+            await self._reject(scope, receive, send, 503, 1, group, reason)
+            return
+
+        retry_after = self.limiter.take((client_key(scope), group), rate, burst)
+        if retry_after:
+            await self._reject(scope, receive, send, 429, retry_after, group, "rate")
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    async def _reject(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        status_code: int,
+        retry_after: float,
+        group: str,
+        reason: str,
+    ):
+        metrics.rate_limit_rejections_total.inc(group=group, reason=reason)
+        response = JSONResponse(
+            status_code=status_code,
+            content={"detail": "Too many requests" if status_code == 429 else "Server busy"},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,633 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, Optional
+
+import aiohttp
+from sqlalchemy import Integer, case, cast, func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from database.db import ReadSessionLocal
+from database.models import DailySales, Order, OrderArchive, OrderItem, OrderStatusEvent
+from services.archive import order_sources
+
+PAID_STATUSES = ["delivered", "completed"]
+
+
+def period_bounds(
+    period: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None
+) -> tuple[datetime, datetime]:
+    """Возвращает (start_dt, end_dt) в UTC по заданному периоду или явным датам.
+
+    period: today | yesterday | week | month
+    start, end: строки вида YYYY-MM-DD (включительно)
+    """
+    now = datetime.utcnow()
+
+    # Нормализуем на начало суток
+    def day_start(dt: datetime) -> datetime:
+        return datetime(dt.year, dt.month, dt.day)
+
+    if start and end:
+        try:
+            start_parts = [int(x) for x in start.split("-")]
+            end_parts = [int(x) for x in end.split("-")]
+            start_dt = datetime(start_parts[0], start_parts[1], start_parts[2])
+            # конец дня включительно → +1 день не включая границу
+            end_dt = datetime(end_parts[0], end_parts[1], end_parts[2]) + timedelta(
+                days=1
+            )
+            return start_dt, end_dt
+        except Exception:
+            # Если формат неверный, по умолчанию сегодня
+            s = day_start(now)
+            return s, s + timedelta(days=1)
+
+    p = (period or "today").lower()
+    if p == "today":
+        s = day_start(now)
+        e = s + timedelta(days=1)
+    elif p == "yesterday":
+        e = day_start(now)
+        s = e - timedelta(days=1)
+    elif p == "week":
+        e = day_start(now) + timedelta(days=1)
+        s = e - timedelta(days=7)
+    elif p == "month":
+        s = datetime(now.year, now.month, 1)
+        # следующий месяц
+        if now.month == 12:
+            e = datetime(now.year + 1, 1, 1)
+        else:
+            e = datetime(now.year, now.month + 1, 1)
+    else:
+        s = day_start(now)
+        e = s + timedelta(days=1)
+    return s, e
+
+
+async def turnover(session: AsyncSession, start_dt: datetime, end_dt: datetime) -> dict:
+    """Оборот и число заказов delivered|completed из агрегата daily_sales"""
+    q = (
+        select(
+            func.coalesce(func.sum(DailySales.gross), 0.0),
+            func.coalesce(func.sum(DailySales.orders_count), 0),
+        )
+        .where(DailySales.day >= start_dt.date())
+        .where(DailySales.day < end_dt.date())
+        .where(DailySales.status.in_(PAID_STATUSES))
+    )
+    total, orders_count = (await session.execute(q)).first()
+    return {
+        "period": {"start": start_dt, "end": end_dt},
+        "turnover": float(total or 0),
+        "orders_count": int(orders_count or 0),
+        "currency": "RUB",
+    }
+
+
+async def sales(
+    session: AsyncSession,
+    start_dt: datetime,
+    end_dt: datetime,
+    statuses: Iterable[str],
+) -> dict:
+    """Заказы с позициями за период в формате SalesResponse"""
+    orders = []
+    for order_model, _ in await order_sources(session, start_dt):
+        orders_stmt = (
+            select(order_model)
+            .where(order_model.created_at >= start_dt)
+            .where(order_model.created_at < end_dt)
+            .where(order_model.status.in_(list(statuses)))
+            .options(selectinload(order_model.items))
+            .order_by(order_model.created_at.desc())
+        )
+        orders.extend((await session.execute(orders_stmt)).scalars().all())
+    # Архивные заказы всегда старше рабочих, но порядок держим явно
+    orders.sort(key=lambda o: o.created_at, reverse=True)
+
+    sales_payload = []
+    cumulative_total = 0.0
+    for o in orders:
+        cumulative_total += float(o.total_price or 0)
+        sales_payload.append(
+            {
+                "id": o.id,
+                "created_at": o.created_at,
+                "user_id": o.user_id,
+                "username": o.username,
+                "status": o.status,
+                "total_price": float(o.total_price or 0),
+                "items": [
+                    {
+                        "name": it.name,
+                        "quantity": it.quantity,
+                        "selected_taste": it.selected_taste,
+                        "price_per_item": float(it.price_per_item),
+                        "total_price": float(it.total_price),
+                    }
+                    for it in o.items
+                ],
+            }
+        )
+
+    return {
+        "period": {"start": start_dt, "end": end_dt},
+        "turnover": float(cumulative_total),
+        "orders_count": len(sales_payload),
+        "sales": sales_payload,
+    }
+
+
+def parse_statuses(status: Optional[str]) -> Optional[list[str]]:
+    """Фильтр status отчетов: один статус или список через запятую; None — без фильтра"""
+    statuses = [part.strip() for part in (status or "").split(",") if part.strip()]
+    return statuses or None
+
+
+def _top_sales_filters(
+    stmt,
+    start_dt: datetime,
+    end_dt: datetime,
+    status: Optional[str],
+    order_model=Order,
+    item_model=OrderItem,
+):
+    statuses = parse_statuses(status) or PAID_STATUSES
+    return (
+        stmt.join(order_model, order_model.id == item_model.order_id)
+        .where(order_model.status.in_(statuses))
+        .where(order_model.created_at >= start_dt)
+        .where(order_model.created_at < end_dt)
+    )
+
+
+async def _top_sales_rows(
+    session: AsyncSession, start_dt: datetime, end_dt: datetime, status: Optional[str]
+):
+    """Проданные позиции за период (рабочие таблицы + архив при необходимости)"""
+    selects = [
+        _top_sales_filters(
+            select(
+                item_model.order_id,
+                item_model.item_id,
+                item_model.name,
+                item_model.selected_taste,
+                item_model.quantity,
+                item_model.total_price,
+            ),
+            start_dt,
+            end_dt,
+            status,
+            order_model,
+            item_model,
+        )
+        for order_model, item_model in await order_sources(session, start_dt)
+    ]
+    return (selects[0] if len(selects) == 1 else union_all(*selects)).subquery()
+
+
+async def top_items(
+    session: AsyncSession,
+    start_dt: datetime,
+    end_dt: datetime,
+    status: Optional[str] = None,
+    limit: int = 10,
+) -> dict:
+    """Топ товаров по проданным штукам за период"""
+    sold = await _top_sales_rows(session, start_dt, end_dt, status)
+    quantity = func.sum(sold.c.quantity).label("quantity")
+
+    stmt = (
+        select(
+            sold.c.item_id,
+            func.max(sold.c.name).label("name"),
+            quantity,
+            func.sum(sold.c.total_price).label("revenue"),
+            func.count(func.distinct(sold.c.order_id)).label("orders_count"),
+        )
+        # У позиций удаленных товаров item_id обнулен — их различаем по названию
+        .group_by(sold.c.item_id, case((sold.c.item_id.is_(None), sold.c.name)))
+        .order_by(quantity.desc())
+        .limit(min(max(limit, 1), 100))
+    )
+    rows = (await session.execute(stmt)).all()
+
+    return {
+        "period": {"start": start_dt, "end": end_dt},
+        "items": [
+            {
+                "item_id": row.item_id,
+                "name": row.name,
+                "quantity": int(row.quantity or 0),
+                "revenue": float(row.revenue or 0),
+                "orders_count": int(row.orders_count or 0),
+            }
+            for row in rows
+        ],
+    }
+
+
+async def top_tastes(
+    session: AsyncSession,
+    start_dt: datetime,
+    end_dt: datetime,
+    status: Optional[str] = None,
+    limit: int = 10,
+) -> dict:
+    """Топ вкусов по проданным штукам за период (позиции без вкуса не учитываются)"""
+    sold = await _top_sales_rows(session, start_dt, end_dt, status)
+    quantity = func.sum(sold.c.quantity).label("quantity")
+
+    stmt = (
+        select(
+            sold.c.selected_taste,
+            quantity,
+            func.sum(sold.c.total_price).label("revenue"),
+            func.count(func.distinct(sold.c.order_id)).label("orders_count"),
+        )
+        .where(sold.c.selected_taste.is_not(None))
+        .where(sold.c.selected_taste != "")
+        .group_by(sold.c.selected_taste)
+        .order_by(quantity.desc())
+        .limit(min(max(limit, 1), 100))
+    )
+    rows = (await session.execute(stmt)).all()
+
+    return {
+        "period": {"start": start_dt, "end": end_dt},
+        "tastes": [
+            {
+                "taste": row.selected_taste,
+                "quantity": int(row.quantity or 0),
+                "revenue": float(row.revenue or 0),
+                "orders_count": int(row.orders_count or 0),
+            }
+            for row in rows
+        ],
+    }
+
+
+# ========================= Время доставки =========================
+
+# metric -> (статус, из которого выходит заказ; статус, в который входит)
+LATENCY_METRICS = {
+    "claim": ("waiting_for_courier", "in_delivery"),
+    "deliver": ("in_delivery", "delivered"),
+}
+LATENCY_GROUPS = ("courier", "delivery", "hour")
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+def _seconds_between(dialect: str, end, start):
+    if dialect == "postgresql":
+        return func.extract("epoch", end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400.0
+
+
+def _hour_of(dialect: str, moment):
+    if dialect == "postgresql":
+        return cast(func.extract("hour", moment), Integer)
+    return cast(func.strftime("%H", moment), Integer)
+
+
+async def delivery_latency(
+    session: AsyncSession,
+    start_dt: datetime,
+    end_dt: datetime,
+    metric: str = "claim",
+    group_by: str = "courier",
+) -> dict:
+    """Перцентили времени ожидания курьера (claim) или доставки (deliver) по группам.
+
+    Длительность — время между входом заказа в статус и переходом в следующий,
+    по журналу order_status_events. Период фильтрует момент перехода.
+    """
+    from_status, to_status = LATENCY_METRICS[metric]
+    dialect = session.get_bind().dialect.name
+    ev = OrderStatusEvent
+
+    # Только заказы, завершившие этап в периоде (индекс to_status, at)
+    order_ids = (
+        select(ev.order_id)
+        .where(ev.to_status == to_status)
+        .where(ev.at >= start_dt)
+        .where(ev.at < end_dt)
+    )
+    window = {"partition_by": ev.order_id, "order_by": (ev.at, ev.id)}
+    steps = (
+        select(
+            ev.order_id,
+            ev.to_status,
+            ev.at,
+            func.lag(ev.to_status).over(**window).label("prev_status"),
+            func.lag(ev.at).over(**window).label("prev_at"),
+        )
+        .where(ev.order_id.in_(order_ids))
+        .subquery()
+    )
+
+    # Журнал переживает архивацию: атрибуты заказа берем и из архива, если он нужен
+    order_models = [Order]
+    archived = await session.scalar(
+        select(OrderArchive.id).where(OrderArchive.id.in_(order_ids)).limit(1)
+    )
+    if archived is not None:
+        order_models.append(OrderArchive)
+    selects = [select(m.id, m.courier_id, m.delivery) for m in order_models]
+    orders = (selects[0] if len(selects) == 1 else union_all(*selects)).subquery()
+
+    group_key = {
+        "courier": orders.c.courier_id,
+        "delivery": orders.c.delivery,
+        "hour": _hour_of(dialect, steps.c.prev_at),
+    }[group_by]
+    durations = (
+        select(
+            group_key.label("key"),
+            _seconds_between(dialect, steps.c.at, steps.c.prev_at).label("seconds"),
+        )
+        .join(orders, orders.c.id == steps.c.order_id)
+        .where(steps.c.to_status == to_status)
+        .where(steps.c.prev_status == from_status)
+        .where(steps.c.at >= start_dt)
+        .where(steps.c.at < end_dt)
+        .subquery()
+    )
+    ranked = select(
+        durations.c.key,
+        durations.c.seconds,
+        func.cume_dist()
+        .over(partition_by=durations.c.key, order_by=durations.c.seconds)
+        .label("cd"),
+    ).subquery()
+
+    percentiles = [
+        func.min(case((ranked.c.cd >= p / 100.0, ranked.c.seconds))).label(f"p{p}")
+        for p in LATENCY_PERCENTILES
+    ]
+    stmt = (
+        select(ranked.c.key, func.count().label("orders_count"), *percentiles)
+        .group_by(ranked.c.key)
+        .order_by(ranked.c.key)
+    )
+    rows = (await session.execute(stmt)).all()
+
+    return {
+        "period": {"start": start_dt, "end": end_dt},
+        "metric": metric,
+        "group_by": group_by,
+        "unit": "seconds",
+        "groups": [
+            {
+                "key": row.key,
+                "orders_count": int(row.orders_count),
+                **{
+                    f"p{p}": round(float(getattr(row, f"p{p}")), 1)
+                    for p in LATENCY_PERCENTILES
+                },
+            }
+            for row in rows
+        ],
+    }
+
+
+# ========================= Экспорт =========================
+
+EXPORT_COLUMNS = [
+    "order_id",
+    "created_at",
+    "status",
+    "user_id",
+    "username",
+    "payment",
+    "delivery",
+    "delivery_cost",
+    "discount",
+    "promocode",
+    "order_total",
+    "item_id",
+    "name",
+    "selected_taste",
+    "quantity",
+    "price_per_item",
+    "total_price",
+]
+EXPORT_BATCH_SIZE = 500
+
+
+def _export_select(order_model, item_model, start_dt: datetime, end_dt: datetime, status):
+    columns = [
+        order_model.id,
+        order_model.created_at,
+        order_model.status,
+        order_model.user_id,
+        order_model.username,
+        order_model.payment,
+        order_model.delivery,
+        order_model.delivery_cost,
+        order_model.discount,
+        order_model.promocode,
+        order_model.total_price,
+        item_model.item_id,
+        item_model.name,
+        item_model.selected_taste,
+        item_model.quantity,
+        item_model.price_per_item,
+        item_model.total_price,
+    ]
+    stmt = (
+        select(
+            *(column.label(name) for column, name in zip(columns, EXPORT_COLUMNS)),
+            item_model.id.label("item_row_id"),
+        )
+        .outerjoin(item_model, item_model.order_id == order_model.id)
+        .where(order_model.created_at >= start_dt)
+        .where(order_model.created_at < end_dt)
+    )
+    statuses = parse_statuses(status)
+    if statuses:
+        stmt = stmt.where(order_model.status.in_(statuses))
+    return stmt
+
+
+def export_statement(
+    start_dt: datetime,
+    end_dt: datetime,
+    status: Optional[str] = None,
+    sources: Optional[list[tuple]] = None,
+):
+    """Запрос выгрузки: одна строка на позицию заказа.
+
+    sources — результат archive.order_sources; по умолчанию только рабочие таблицы.
+    """
+    selects = [
+        _export_select(order_model, item_model, start_dt, end_dt, status)
+        for order_model, item_model in (sources or [(Order, OrderItem)])
+    ]
+    rows = (selects[0] if len(selects) == 1 else union_all(*selects)).subquery()
+    return select(*(rows.c[name] for name in EXPORT_COLUMNS)).order_by(
+        rows.c.created_at, rows.c.order_id, rows.c.item_row_id
+    )
+
+
+def export_filename(start_dt: datetime, end_dt: datetime, fmt: str) -> str:
+    return f"orders_{start_dt:%Y-%m-%d}_{end_dt - timedelta(days=1):%Y-%m-%d}.{fmt}"
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def export_rows(stmt, fmt: str) -> AsyncIterator[str]:
+    """Построчно отдает выгрузку из серверного курсора, не держа ее в памяти целиком.
+
+    Сессия открывается внутри генератора: зависимость get_db закрывается
+    раньше, чем StreamingResponse начинает отправку.
+    """
+    async with ReadSessionLocal() as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            # BOM, чтобы Excel корректно открыл кириллицу
+            buffer.write("\ufeff")
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+            async for rows in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                for row in rows:
+                    writer.writerow([_export_value(value) for value in row])
+                yield buffer.getvalue()
+        else:
+            async for rows in result.partitions():
+                yield "".join(
+                    json.dumps(
+                        dict(zip(EXPORT_COLUMNS, map(_export_value, row))),
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                    for row in rows
+                )
+
+
+# ========================= Вызовы из бота =========================
+
+
+async def _run_local(endpoint: str, params: dict) -> dict:
+    start_dt, end_dt = period_bounds(
+        params.get("period"), params.get("start"), params.get("end")
+    )
+    async with ReadSessionLocal() as session:
+        if endpoint == "/analytics/turnover":
+            return await turnover(session, start_dt, end_dt)
+        if endpoint == "/analytics/sales":
+            return await sales(session, start_dt, end_dt, PAID_STATUSES)
+        if endpoint == "/analytics/canceled_orders":
+            return await sales(session, start_dt, end_dt, ["canceled"])
+        if endpoint == "/analytics/completed_orders":
+            return await sales(session, start_dt, end_dt, ["completed"])
+        if endpoint == "/analytics/top_items":
+            return await top_items(session, start_dt, end_dt, params.get("status"))
+        if endpoint == "/analytics/top_tastes":
+            return await top_tastes(session, start_dt, end_dt, params.get("status"))
+    raise ValueError(f"Unknown analytics endpoint: {endpoint}")
+
+
+class AnalyticsHTTPClient:
+    """Клиент к /analytics/* другого инстанса с одним переиспользуемым пулом соединений"""
+
+    def __init__(self, base_url: str, pool_size: int = 10, timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_size, keepalive_timeout=60
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def get_json(self, endpoint: str, params: dict) -> dict:
+        async with self._get_session().get(
+            f"{self.base_url}{endpoint}", params=params
+        ) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    async def get_bytes(self, endpoint: str, params: dict) -> bytes:
+        async with self._get_session().get(
+            f"{self.base_url}{endpoint}", params=params
+        ) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# local — бот вызывает функции этого модуля напрямую через ReadSessionLocal;
+# http — для раздельного развертывания: запросы в BACKEND_URL через общий пул
+ANALYTICS_MODE = os.getenv("ANALYTICS_MODE", "local").lower()
+_http_client: Optional[AnalyticsHTTPClient] = None
+
+
+def _get_http_client() -> AnalyticsHTTPClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = AnalyticsHTTPClient(
+            os.getenv("BACKEND_URL", "https://tgifts.space"),
+            pool_size=int(os.getenv("ANALYTICS_HTTP_POOL_SIZE", "10")),
+        )
+    return _http_client
+
+
+async def run_report(endpoint: str, params: Optional[dict] = None) -> dict:
+    """Выполняет отчет /analytics/* в процессе или через HTTP (ANALYTICS_MODE=http)"""
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    if ANALYTICS_MODE == "http":
+        return await _get_http_client().get_json(endpoint, params)
+    return await _run_local(endpoint, params)
+
+
+async def export_file(params: Optional[dict] = None, fmt: str = "csv") -> tuple[bytes, str]:
+    """Собирает выгрузку целиком для отправки документом: (содержимое, имя файла)"""
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    start_dt, end_dt = period_bounds(
+        params.get("period"), params.get("start"), params.get("end")
+    )
+    filename = export_filename(start_dt, end_dt, fmt)
+    if ANALYTICS_MODE == "http":
+        data = await _get_http_client().get_bytes(
+            "/analytics/export", {"format": fmt, **params}
+        )
+        return data, filename
+
+    async with ReadSessionLocal() as session:
+        sources = await order_sources(session, start_dt)
+    buffer = io.BytesIO()
+    stmt = export_statement(start_dt, end_dt, params.get("status"), sources)
+    async for chunk in export_rows(stmt, fmt):
+        buffer.write(chunk.encode("utf-8"))
+    return buffer.getvalue(), filename
+
+
+async def close():
+    """Закрывает пул HTTP-клиента (если он создавался)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.close()
+        _http_client = None
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Order, OrderArchive, OrderItem, OrderItemArchive, OrderMessage
+from database.writer import writer
+
+ARCHIVE_STATUSES = ("completed", "canceled")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", "500"))
+# Архивация в процессе-лидере API; 0 — только вручную/по cron через CLI
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ORDER_ARCHIVE_INTERVAL_HOURS", "24"))
+
+HOT = (Order, OrderItem)
+COLD = (OrderArchive, OrderItemArchive)
+
+_ORDER_COLUMNS = [column.name for column in Order.__table__.columns]
+_ITEM_COLUMNS = [column.name for column in OrderItem.__table__.columns]
+
+
+def _archive_batch(cutoff: datetime, batch_size: int):
+    """Операция для writer: переносит одну пачку заказов в архив, возвращает их число"""
+
+    async def op(session: AsyncSession) -> int:
+        # Самый новый заказ не трогаем: SQLite без AUTOINCREMENT выдал бы его id повторно
+        newest_id = select(func.max(Order.id)).scalar_subquery()
+        ids = (
+            await session.scalars(
+                select(Order.id)
+                .where(Order.status.in_(ARCHIVE_STATUSES))
+                .where(Order.created_at < cutoff)
+                .where(Order.id < newest_id)
+                .order_by(Order.created_at)
+                .limit(batch_size)
+            )
+        ).all()
+        if not ids:
+            return 0
+
+        await session.execute(
+            insert(OrderArchive).from_select(
+                [*_ORDER_COLUMNS, "archived_at"],
+                select(
+                    *(getattr(Order, name) for name in _ORDER_COLUMNS),
+                    literal(datetime.utcnow()),
+                ).where(Order.id.in_(ids)),
+            )
+        )
+        await session.execute(
+            insert(OrderItemArchive).from_select(
+                _ITEM_COLUMNS,
+                select(*(getattr(OrderItem, name) for name in _ITEM_COLUMNS)).where(
+                    OrderItem.order_id.in_(ids)
+                ),
+            )
+        )
+        await session.execute(delete(OrderMessage).where(OrderMessage.order_id.in_(ids)))
+        await session.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids)))
+        await session.execute(delete(Order).where(Order.id.in_(ids)))
+        return len(ids)
+
+    return op
+
+
+async def archive_orders(
+    older_than_days: Optional[int] = None, batch_size: Optional[int] = None
+) -> int:
+    """Переносит завершенные и отмененные заказы старше N дней в orders_archive.
+
+    Каждая пачка — отдельная транзакция через writer, чтобы не держать
+    блокировку записи надолго. Возвращает число перенесенных заказов.
+    """
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    op = _archive_batch(cutoff, batch_size or ARCHIVE_BATCH_SIZE)
+    total = 0
+    while True:
+        moved = await writer.submit(op)
+        if not moved:
+            return total
+        total += moved
+
+
+async def reaches_archive(session: AsyncSession, start_dt: datetime) -> bool:
+    """Нужен ли архив для периода, начинающегося с start_dt"""
+    newest = await session.scalar(select(func.max(OrderArchive.created_at)))
+    return newest is not None and newest >= start_dt
+
+
+async def order_sources(
+    session: AsyncSession, start_dt: Optional[datetime] = None
+) -> list[tuple]:
+    """Пары (модель заказа, модель позиции) для чтения периода: рабочие таблицы
+    и, если период уходит в архив, архивные. start_dt=None — вся история.
+    """
+    if start_dt is None:
+        return [HOT, COLD]
+    return [HOT, COLD] if await reaches_archive(session, start_dt) else [HOT]
+
+
+async def main():
+    """Архивация по расписанию (cron): python -m services.archive [--days 90]"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    moved = await archive_orders(args.days, args.batch_size)
+    print(f"✅ В архив перенесено заказов: {moved}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
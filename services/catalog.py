@@ -0,0 +1,24 @@
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import BasketItem, OrderHistory, OrderItem, item_taste_association
+
+
+async def detach_item(session: AsyncSession, item_id: int):
+    """Снимает ссылки на товар перед его удалением (в той же транзакции).
+
+    С PRAGMA foreign_keys=ON удаление товара со ссылками падает. Позиции
+    заказов сохраняют название и цены, поэтому у них только обнуляется item_id;
+    строки корзин, orders_history и связи с вкусами удаляются.
+    """
+    await session.execute(
+        update(OrderItem)
+        .where(OrderItem.item_id == item_id)
+        .values(item_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(delete(BasketItem).where(BasketItem.item_id == item_id))
+    await session.execute(delete(OrderHistory).where(OrderHistory.item_id == item_id))
+    await session.execute(
+        delete(item_taste_association).where(item_taste_association.c.item_id == item_id)
+    )
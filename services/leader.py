@@ -0,0 +1,111 @@
+"""Выбор лидера среди процессов на одном хосте (воркеры gunicorn/uvicorn).
+
+Лидер — процесс, захвативший межпроцессную блокировку файла (fasteners).
+Блокировка и есть аренда: она действует, пока жив процесс, и ОС снимает ее
+при падении. Остальные процессы раз в LEADER_RETRY_SECONDS пробуют ее
+захватить, так что после падения лидера его место занимают за несколько секунд.
+HTTP обслуживают все процессы, фоновые задачи запускает только лидер.
+"""
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Awaitable, Callable, Optional
+
+import fasteners
+
+logger = logging.getLogger(__name__)
+
+# Во временном каталоге, а не в рабочем: файл общий для всех воркеров хоста
+LEADER_LOCK_PATH = os.getenv(
+    "LEADER_LOCK_PATH", os.path.join(tempfile.gettempdir(), "shop-leader.lock")
+)
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "5"))
+LEADER_RESTART_SECONDS = float(os.getenv("LEADER_RESTART_SECONDS", "5"))
+
+Job = Callable[[], Awaitable[None]]
+
+
+class LeaderElection:
+    def __init__(self, path: Optional[str] = None, retry_interval: Optional[float] = None):
+        self.path = path or LEADER_LOCK_PATH
+        self.retry_interval = retry_interval or LEADER_RETRY_SECONDS
+        self._lock = fasteners.InterProcessLock(self.path)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock.acquired
+
+    def start(self, jobs: list[Job]):
+        """Запускает борьбу за лидерство; jobs стартуют, когда процесс станет лидером"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(jobs))
+
+    async def stop(self):
+        """Останавливает задачи лидера и отпускает блокировку"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, jobs: list[Job]):
+        # Захват без ожидания: занятая блокировка не должна держать event loop
+        while not self._lock.acquire(blocking=False):
+            await asyncio.sleep(self.retry_interval)
+        logger.info(f"Process {os.getpid()} is the leader")
+        tasks = [asyncio.create_task(_guarded(job)) for job in jobs]
+        try:
+            await asyncio.gather(*tasks)
+            # Задачи закончились (разовые), блокировку держим до остановки процесса
+            await asyncio.Event().wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._lock.release()
+
+
+async def _guarded(job: Job):
+    try:
+        await job()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Leader job {getattr(job, '__name__', job)} failed: {e}", exc_info=True)
+
+
+def periodic(interval: float, job: Job) -> Job:
+    """Повторяет job раз в interval секунд (первый запуск — сразу)"""
+
+    async def repeat():
+        while True:
+            await _guarded(job)
+            await asyncio.sleep(interval)
+
+    repeat.__name__ = getattr(job, "__name__", "periodic")
+    return repeat
+
+
+def keep_running(job: Job, name: str, delay: float = LEADER_RESTART_SECONDS) -> Job:
+    """Перезапускает долгую задачу (polling бота), если она завершилась или упала.
+
+    Иначе лидер держал бы блокировку без работающей задачи, и другие
+    процессы не смогли бы ее подхватить.
+    """
+
+    async def supervise():
+        while True:
+            await _guarded(job)
+            logger.warning(f"Leader job {name} stopped, restarting in {delay}s")
+            await asyncio.sleep(delay)
+
+    supervise.__name__ = name
+    return supervise
+
+
+leader = LeaderElection()
@@ -0,0 +1,274 @@
+"""Метрики процесса в текстовом формате Prometheus, без внешних зависимостей.
+
+Метрики живут в памяти процесса и отдаются на /metrics; при нескольких
+воркерах каждый отдает свои, суммирует их Prometheus.
+"""
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional, Sequence
+
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, callback: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # callback — значение считается в момент отдачи /metrics (глубина очереди и т.п.)
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list[str]:
+        if self.callback is not None:
+            self._values[()] = self.callback()
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # [счетчики по корзинам..., count, sum]
+            state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-2] += 1
+        state[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), state):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {state[-2]}")
+            lines.append(f"{self.name}_sum{labels} {_number(state[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ========================= HTTP =========================
+
+http_requests_total = REGISTRY.register(
+    Counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+)
+http_request_duration = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template",
+        ("method", "route", "status"),
+    )
+)
+http_requests_in_flight = REGISTRY.register(
+    Gauge("http_requests_in_flight", "HTTP requests being processed", ("method",))
+)
+
+rate_limit_rejections_total = REGISTRY.register(
+    Counter(
+        "rate_limit_rejections_total",
+        "Write requests rejected by rate limit (429) or load shedding (503)",
+        ("group", "reason"),
+    )
+)
+
+# ========================= База данных =========================
+
+db_queries_total = REGISTRY.register(
+    Counter("db_queries_total", "SQL statements executed", ("engine",))
+)
+db_query_duration = REGISTRY.register(
+    Histogram("db_query_duration_seconds", "SQL statement execution time", ("engine",))
+)
+db_errors_total = REGISTRY.register(
+    Counter("db_errors_total", "SQL statement errors", ("engine", "kind"))
+)
+db_queries_per_request = REGISTRY.register(
+    Histogram(
+        "db_queries_per_request",
+        "SQL statements per HTTP request",
+        ("route",),
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+    )
+)
+db_time_per_request = REGISTRY.register(
+    Histogram("db_time_per_request_seconds", "SQL time per HTTP request", ("route",))
+)
+db_write_queue_wait = REGISTRY.register(
+    Histogram(
+        "db_write_queue_wait_seconds",
+        "Time a write waits for the single SQLite writer (lock wait)",
+    )
+)
+db_write_batch_size = REGISTRY.register(
+    Histogram(
+        "db_write_batch_size",
+        "Writes committed per group commit",
+        buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+    )
+)
+
+# ========================= Telegram =========================
+
+telegram_api_duration = REGISTRY.register(
+    Histogram("telegram_api_duration_seconds", "Bot API call latency", ("method",))
+)
+telegram_api_errors_total = REGISTRY.register(
+    Counter("telegram_api_errors_total", "Bot API call errors", ("method", "error"))
+)
+telegram_updates_total = REGISTRY.register(
+    Counter("telegram_updates_total", "Updates handled by the bot", ("type", "status"))
+)
+telegram_update_duration = REGISTRY.register(
+    Histogram("telegram_update_duration_seconds", "Update handling time", ("type",))
+)
+
+
+def register_gauge(name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+    """Метрика, значение которой читается при каждой отдаче /metrics"""
+    return REGISTRY.register(Gauge(name, documentation, callback=callback))
+
+
+# ========================= Запросы к БД в рамках HTTP-запроса =========================
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+# Заполняется MetricsMiddleware; SQLAlchemy переносит контекст в greenlet драйвера
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+_instrumented: set[int] = set()
+
+
+def instrument_engine(async_engine, name: str):
+    """Считает запросы, их время и ошибки движка; повторный вызов ничего не делает"""
+    sync_engine = async_engine.sync_engine
+    if id(sync_engine) in _instrumented:
+        return
+    _instrumented.add(id(sync_engine))
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        db_queries_total.inc(engine=name)
+        db_query_duration.observe(elapsed, engine=name)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("metrics_started") if context.connection else None
+        if started:
+            started.pop()
+        message = str(context.original_exception).lower()
+        kind = "locked" if "database is locked" in message else type(
+            context.original_exception
+        ).__name__
+        db_errors_total.inc(engine=name, kind=kind)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,87 @@
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import upsert
+from database.models import OrderMessage
+
+logger = logging.getLogger(__name__)
+
+# Виды сообщений: уведомление о новом заказе, карточка в списке, переписка об отмене
+NEW_ORDER = "new_order"
+CARD = "card"
+CANCEL_PROMPT = "cancel_prompt"
+# Копии карточки заказа, которые перерисовываются при смене статуса
+CARD_KINDS = (NEW_ORDER, CARD)
+
+# Лимит deleteMessages в Bot API
+DELETE_BATCH_SIZE = 100
+
+
+def remember(order_id: int, chat_id: int, message_id: int, kind: str):
+    """Операция для writer: запоминает сообщение бота о заказе"""
+    return remember_many([(order_id, chat_id, message_id, kind)])
+
+
+def remember_many(entries: Iterable[tuple[int, int, int, str]]):
+    """Операция для writer: одним INSERT запоминает (order_id, chat_id, message_id, kind)"""
+    rows = [
+        {"order_id": order_id, "chat_id": chat_id, "message_id": message_id, "kind": kind}
+        for order_id, chat_id, message_id, kind in entries
+    ]
+
+    async def op(session: AsyncSession):
+        if not rows:
+            return
+        await session.execute(
+            upsert(session, OrderMessage)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["order_id", "chat_id", "message_id"])
+        )
+
+    return op
+
+
+async def messages_for(
+    session: AsyncSession, order_id: int, kinds: Optional[Iterable[str]] = None
+) -> list[tuple[int, int]]:
+    """Пары (chat_id, message_id) сообщений бота о заказе (всех или заданных видов)"""
+    stmt = select(OrderMessage.chat_id, OrderMessage.message_id).where(
+        OrderMessage.order_id == order_id
+    )
+    if kinds is not None:
+        stmt = stmt.where(OrderMessage.kind.in_(list(kinds)))
+    rows = await session.execute(stmt)
+    return [tuple(row) for row in rows]
+
+
+async def pop(session: AsyncSession, order_id: int) -> list[tuple[int, int]]:
+    """Забирает сообщения заказа для удаления; строки удаляются при commit сессии"""
+    pairs = await messages_for(session, order_id)
+    await session.execute(delete(OrderMessage).where(OrderMessage.order_id == order_id))
+    return pairs
+
+
+async def delete_messages(bot, pairs: Iterable[tuple[int, int]], limiter=None):
+    """Удаляет сообщения пачками deleteMessages: один вызов на чат и до 100 сообщений.
+
+    limiter — bot.rate_limit.TelegramRateLimiter, если вызовы надо растянуть.
+    """
+    by_chat = defaultdict(set)
+    for chat_id, message_id in pairs:
+        if message_id:
+            by_chat[chat_id].add(message_id)
+
+    for chat_id, message_ids in by_chat.items():
+        message_ids = sorted(message_ids)
+        for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+            batch = message_ids[start : start + DELETE_BATCH_SIZE]
+            if limiter is not None:
+                await limiter.wait(chat_id)
+            try:
+                await bot.delete_messages(chat_id=chat_id, message_ids=batch)
+            except Exception as e:
+                logger.error(f"Ошибка при удалении сообщений {batch} в чате {chat_id}: {e}")
@@ -0,0 +1,32 @@
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Order, OrderStatusEvent
+from services import popularity, sales_rollup
+
+
+async def record_status_change(
+    session: AsyncSession,
+    order: Order,
+    from_status: Optional[str],
+    to_status: Optional[str],
+    actor: Optional[str] = None,
+):
+    """Обновляет все производные данные при смене статуса заказа.
+
+    Вызывается до commit в той же сессии, что и изменение заказа.
+    from_status=None — заказ только что создан.
+    actor — кто сменил статус: tg:<telegram_id> для бота, api для HTTP.
+    """
+    if from_status != to_status:
+        session.add(
+            OrderStatusEvent(
+                order_id=order.id,
+                from_status=from_status,
+                to_status=to_status,
+                actor=actor,
+            )
+        )
+    await sales_rollup.apply_status_change(session, order, from_status, to_status)
+    await popularity.apply_status_change(session, order, from_status, to_status)
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import AsyncSessionLocal
+from database.models import Item, Order, OrderArchive, OrderItem, OrderItemArchive
+
+
+async def _add_order_quantities(session: AsyncSession, order_id: int, sign: int):
+    """Прибавляет (sign=1) или вычитает (sign=-1) штуки заказа из popularity_score"""
+    sold = (
+        select(func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id == order_id)
+        .where(OrderItem.item_id == Item.id)
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(Item)
+        .where(
+            Item.id.in_(
+                select(OrderItem.item_id).where(OrderItem.order_id == order_id)
+            )
+        )
+        .values(popularity_score=func.coalesce(Item.popularity_score, 0) + sign * sold)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def apply_status_change(
+    session: AsyncSession,
+    order: Order,
+    from_status: Optional[str],
+    to_status: Optional[str],
+):
+    """Учитывает заказ в популярности товаров при входе в статус completed и выходе из него"""
+    if from_status == to_status:
+        return
+    if to_status == "completed":
+        await _add_order_quantities(session, order.id, 1)
+    elif from_status == "completed":
+        await _add_order_quantities(session, order.id, -1)
+
+
+def _completed_quantity(order_model, item_model):
+    """Штуки товара Item.id в завершенных заказах одной пары таблиц (рабочей или архивной)"""
+    return (
+        select(func.coalesce(func.sum(item_model.quantity), 0))
+        .join(order_model, order_model.id == item_model.order_id)
+        .where(order_model.status == "completed")
+        .where(item_model.item_id == Item.id)
+        .scalar_subquery()
+    )
+
+
+async def rebuild(session: AsyncSession):
+    """Пересчитывает popularity_score всех товаров по завершенным заказам, включая архив"""
+    await session.execute(
+        update(Item)
+        .values(
+            popularity_score=_completed_quantity(Order, OrderItem)
+            + _completed_quantity(OrderArchive, OrderItemArchive)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def main():
+    """Полный пересчёт популярности: python -m services.popularity"""
+    async with AsyncSessionLocal() as session:
+        await rebuild(session)
+        await session.commit()
+        print("✅ popularity_score пересчитан")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+import asyncio
+from typing import Optional
+
+from sqlalchemy import delete, func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import AsyncSessionLocal, upsert
+from database.models import DailySales, Order, OrderArchive, OrderItem, OrderItemArchive
+
+ROLLUP_METRICS = ("orders_count", "items_count", "gross", "discount", "delivery_cost")
+
+
+async def _order_totals(session: AsyncSession, order_id: int) -> tuple[int, float]:
+    """Возвращает (количество товаров, сумма позиций без скидки) по заказу"""
+    row = (
+        await session.execute(
+            select(
+                func.coalesce(func.sum(OrderItem.quantity), 0),
+                func.coalesce(func.sum(OrderItem.total_price), 0.0),
+            ).where(OrderItem.order_id == order_id)
+        )
+    ).first()
+    return int(row[0] or 0), float(row[1] or 0)
+
+
+async def _bump(session: AsyncSession, order: Order, status: str, values: dict):
+    """Прибавляет значения к строке агрегата (день, статус, доставка, оплата)"""
+    stmt = upsert(session, DailySales).values(
+        day=order.created_at.date(),
+        status=status,
+        delivery=order.delivery,
+        payment=order.payment,
+        **values,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "status", "delivery", "payment"],
+        set_={
+            name: getattr(DailySales, name) + getattr(stmt.excluded, name)
+            for name in ROLLUP_METRICS
+        },
+    )
+    await session.execute(stmt)
+
+
+async def apply_status_change(
+    session: AsyncSession,
+    order: Order,
+    from_status: Optional[str],
+    to_status: Optional[str],
+):
+    """Переносит вклад заказа в daily_sales из старого статуса в новый.
+
+    Вызывается до commit, чтобы агрегат менялся в той же транзакции, что и заказ.
+    from_status=None — заказ только что создан.
+    """
+    if from_status == to_status or order.created_at is None:
+        return
+
+    items_count, subtotal = await _order_totals(session, order.id)
+    values = {
+        "orders_count": 1,
+        "items_count": items_count,
+        "gross": float(order.total_price or 0),
+        "discount": subtotal * (order.discount or 0) / 100,
+        "delivery_cost": float(order.delivery_cost or 0),
+    }
+
+    if from_status:
+        await _bump(session, order, from_status, {k: -v for k, v in values.items()})
+    if to_status:
+        await _bump(session, order, to_status, values)
+
+
+def _rollup_rows(order_model, item_model):
+    """Построчный вклад заказов одной пары таблиц (рабочие или архив)"""
+    items = (
+        select(
+            item_model.order_id.label("order_id"),
+            func.sum(item_model.quantity).label("items_count"),
+            func.sum(item_model.total_price).label("subtotal"),
+        )
+        .group_by(item_model.order_id)
+        .subquery()
+    )
+    return (
+        select(
+            func.date(order_model.created_at).label("day"),
+            order_model.status.label("status"),
+            order_model.delivery.label("delivery"),
+            order_model.payment.label("payment"),
+            items.c.items_count.label("items_count"),
+            order_model.total_price.label("gross"),
+            (items.c.subtotal * func.coalesce(order_model.discount, 0) / 100.0).label(
+                "discount"
+            ),
+            order_model.delivery_cost.label("delivery_cost"),
+        )
+        .outerjoin(items, items.c.order_id == order_model.id)
+        .where(order_model.created_at.is_not(None))
+    )
+
+
+async def rebuild(session: AsyncSession):
+    """Пересчитывает daily_sales целиком по таблице orders и архиву"""
+    rows = union_all(
+        _rollup_rows(Order, OrderItem), _rollup_rows(OrderArchive, OrderItemArchive)
+    ).subquery()
+    source = select(
+        rows.c.day,
+        rows.c.status,
+        rows.c.delivery,
+        rows.c.payment,
+        func.count(),
+        func.coalesce(func.sum(rows.c.items_count), 0),
+        func.coalesce(func.sum(rows.c.gross), 0.0),
+        func.coalesce(func.sum(rows.c.discount), 0.0),
+        func.coalesce(func.sum(rows.c.delivery_cost), 0.0),
+    ).group_by(rows.c.day, rows.c.status, rows.c.delivery, rows.c.payment)
+
+    await session.execute(delete(DailySales))
+    await session.execute(
+        DailySales.__table__.insert().from_select(
+            ["day", "status", "delivery", "payment", *ROLLUP_METRICS], source
+        )
+    )
+
+
+async def rebuild_if_empty(session: AsyncSession) -> bool:
+    """Заполняет daily_sales, если таблица пуста, а заказы уже есть"""
+    has_rollup = await session.scalar(select(DailySales.day).limit(1))
+    if has_rollup is not None:
+        return False
+    has_orders = await session.scalar(select(Order.id).limit(1))
+    if has_orders is None:
+        return False
+    await rebuild(session)
+    return True
+
+
+async def main():
+    """Полный пересчёт агрегата: python -m services.sales_rollup"""
+    async with AsyncSessionLocal() as session:
+        await rebuild(session)
+        await session.commit()
+        rows = await session.scalar(select(func.count()).select_from(DailySales))
+        print(f"✅ daily_sales пересчитана: {rows} строк")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import upsert
+from database.models import TelegramFile
+
+
+def remember(path: str, file_id: str):
+    """Операция для writer: запоминает (или заменяет) file_id картинки"""
+
+    async def op(session: AsyncSession):
+        stmt = upsert(session, TelegramFile).values(
+            path=path, file_id=file_id, updated_at=datetime.utcnow()
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["path"],
+                set_={"file_id": stmt.excluded.file_id, "updated_at": stmt.excluded.updated_at},
+            )
+        )
+
+    return op
+
+
+async def file_ids(session: AsyncSession, paths: Iterable[str]) -> dict[str, str]:
+    """file_id по путям картинок; путей без загрузки в Telegram в ответе нет"""
+    paths = {path for path in paths if path}
+    if not paths:
+        return {}
+    rows = await session.execute(
+        select(TelegramFile.path, TelegramFile.file_id).where(TelegramFile.path.in_(paths))
+    )
+    return dict(rows.all())
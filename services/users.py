@@ -0,0 +1,19 @@
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import upsert
+from database.models import DBUser
+
+
+async def ensure_user(session: AsyncSession, user_id: int, username: Optional[str] = None):
+    """Создает строку users, если пользователь еще не открывал бота или приложение.
+
+    Нужна перед вставкой строк со ссылкой на users (например, couriers):
+    с PRAGMA foreign_keys=ON без нее вставка падает. Существующую строку не меняет.
+    """
+    await session.execute(
+        upsert(session, DBUser)
+        .values(id=user_id, telegram_id=user_id, username=username)
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+# До импорта приложения: отдельная БД, без бота, фоновых задач и FSM в БД
+_tmp = tempfile.mkdtemp(prefix="shop-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp}/test.db"
+os.environ["LEADER_LOCK_PATH"] = os.path.join(_tmp, "leader.lock")
+os.environ["START_BOT"] = "false"
+os.environ["FSM_STORAGE"] = "memory"
+os.environ.setdefault("QUERY_BUDGET", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from database import query_budget
+from database.db import AsyncSessionLocal, engine
+from database.models import Base
+
+
+class _SentMessage:
+    def __init__(self, chat_id, message_id):
+        self.chat = type("Chat", (), {"id": chat_id})()
+        self.message_id = message_id
+
+
+@pytest.fixture
+def assert_max_queries():
+    """with assert_max_queries(n): ... — не больше n SQL-запросов внутри блока"""
+    return query_budget.assert_max_queries
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """TestClient на чистой БД; Telegram не вызывается, задачи лидера не запускаются"""
+
+    async def send_message(chat_id, text, **kwargs):
+        return _SentMessage(chat_id, 1)
+
+    monkeypatch.setattr(main, "leader_jobs", list)
+    monkeypatch.setattr(main.bot, "send_message", send_message)
+
+    async def reset_db():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    with TestClient(main.app) as test_client:
+        test_client.portal.call(reset_db)
+        yield test_client
+
+
+@pytest.fixture
+def seed(client):
+    """seed(*objects) — сохраняет модели в БД приложения"""
+
+    def add(*objects):
+        async def save():
+            async with AsyncSessionLocal() as session:
+                session.add_all(objects)
+                await session.commit()
+
+        client.portal.call(save)
+
+    return add
@@ -0,0 +1,41 @@
+"""Фильтр status выгрузки заказов принимает список через запятую, как top_items"""
+import csv
+import io
+from datetime import datetime
+
+from database.models import DBUser, Order, OrderItem
+
+STATUSES = ["completed", "canceled", "waiting_for_courier"]
+
+
+def _export_statuses(client, status: str) -> set[str]:
+    response = client.get(
+        "/analytics/export", params={"start": "2026-01-01", "end": "2026-02-01", "status": status}
+    )
+    assert response.status_code == 200
+    return {row["status"] for row in csv.DictReader(io.StringIO(response.text))}
+
+
+def test_export_status_list(client, seed):
+    seed(
+        DBUser(id=1, username="buyer"),
+        *(
+            Order(
+                id=order_id,
+                user_id=1,
+                status=status,
+                created_at=datetime(2026, 1, 10),
+                delivery="Курьер",
+                payment="cash",
+                total_price=10,
+                items=[
+                    OrderItem(name="item", quantity=1, price_per_item=10, total_price=10)
+                ],
+            )
+            for order_id, status in enumerate(STATUSES, start=1)
+        ),
+    )
+
+    assert _export_statuses(client, "completed") == {"completed"}
+    assert _export_statuses(client, "completed, canceled") == {"completed", "canceled"}
+    assert _export_statuses(client, "") == set(STATUSES)
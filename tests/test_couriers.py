@@ -0,0 +1,51 @@
+"""Добавление курьера из бота при включенных внешних ключах"""
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import select
+
+import bot.bot as bot_module
+from database.db import AsyncSessionLocal
+from database.models import Courier, DBUser
+
+NEW_COURIER_ID = 555000111
+
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.text = text
+        self.answers: list[str] = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+# Шаг «модель машины» зарегистрирован дважды (регистрация курьера и меню админа)
+CAR_MODEL_HANDLERS = [
+    handler.callback
+    for handler in bot_module.dp.message.handlers
+    if handler.callback.__name__ == "process_courier_car_model"
+]
+
+
+@pytest.mark.parametrize("handler", CAR_MODEL_HANDLERS)
+def test_add_courier_without_user_row(client, handler):
+    async def run():
+        state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=1, user_id=1))
+        await state.update_data(user_id=NEW_COURIER_ID, username="new_courier", phone="+375")
+        message = FakeMessage("Lada")
+        await handler(message, state)
+
+        async with AsyncSessionLocal() as session:
+            courier = await session.scalar(
+                select(Courier).where(Courier.user_id == NEW_COURIER_ID)
+            )
+            user = await session.get(DBUser, NEW_COURIER_ID)
+        return message.answers, courier, user
+
+    answers, courier, user = client.portal.call(run)
+    assert answers and answers[-1].startswith("✅"), answers
+    assert courier is not None and courier.car_model == "Lada"
+    assert user is not None and user.username == "new_courier"
+    bot_module.COURIERS.remove(NEW_COURIER_ID)
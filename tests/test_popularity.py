@@ -0,0 +1,57 @@
+"""Пересчет popularity_score не теряет продажи, перенесенные в архив"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from database.db import AsyncSessionLocal
+from database.models import Category, DBUser, Item, Order, OrderArchive, OrderItem
+from services import archive, popularity
+
+
+def _order(order_id: int, status: str, created_at: datetime, quantity: int) -> Order:
+    return Order(
+        id=order_id,
+        user_id=1,
+        status=status,
+        created_at=created_at,
+        delivery="Курьер",
+        payment="cash",
+        total_price=10 * quantity,
+        items=[
+            OrderItem(
+                item_id=1,
+                name="item",
+                quantity=quantity,
+                price_per_item=10,
+                total_price=10 * quantity,
+            )
+        ],
+    )
+
+
+def test_rebuild_counts_archived_orders(client, seed):
+    old = datetime.utcnow() - timedelta(days=365)
+    seed(
+        Category(id=1, name="category"),
+        Item(id=1, name="item", price=10, category_id=1),
+        DBUser(id=1, username="buyer"),
+        _order(1, "completed", old, 3),
+        _order(2, "completed", old, 2),
+        _order(3, "canceled", old, 7),
+        _order(4, "completed", datetime.utcnow(), 1),
+    )
+
+    async def rebuild_score() -> int:
+        async with AsyncSessionLocal() as session:
+            await popularity.rebuild(session)
+            await session.commit()
+            return await session.scalar(select(Item.popularity_score).where(Item.id == 1))
+
+    async def archived_count() -> int:
+        async with AsyncSessionLocal() as session:
+            return len((await session.scalars(select(OrderArchive.id))).all())
+
+    assert client.portal.call(rebuild_score) == 6
+    assert client.portal.call(archive.archive_orders, 30) == 3
+    assert client.portal.call(archived_count) == 3
+    assert client.portal.call(rebuild_score) == 6
@@ -0,0 +1,80 @@
+"""Число SQL-запросов горячих эндпоинтов: рост — регрессия (N+1), уменьшение — повод обновить лимит"""
+import pytest
+
+from database.models import Basket, BasketItem, Category, DBUser, Item, Taste
+
+USER_ID = 1001
+ORDER_FROM_BASKET_QUERIES = 21
+
+
+@pytest.fixture
+def catalog(seed):
+    tastes = [Taste(id=i, name=f"taste {i}") for i in range(1, 4)]
+    seed(
+        *(Category(id=c, name=f"category {c}") for c in range(1, 4)),
+        *(
+            Item(
+                id=i,
+                name=f"item {i}",
+                price=10 * i,
+                category_id=i % 3 + 1,
+                image=f"/uploads/item{i}.png",
+                tastes=tastes,
+            )
+            for i in range(1, 31)
+        ),
+    )
+
+
+def seed_basket(seed, lines: int):
+    seed(
+        DBUser(id=USER_ID, username="buyer"),
+        Basket(
+            id=1,
+            user_id=USER_ID,
+            items=[
+                BasketItem(item_id=i, quantity=2, price=10 * i, selected_taste="taste 1")
+                for i in range(1, lines + 1)
+            ],
+        ),
+    )
+
+
+@pytest.fixture
+def basket(seed, catalog):
+    seed_basket(seed, 10)
+
+
+def test_items(client, catalog, assert_max_queries):
+    with assert_max_queries(3):
+        response = client.get("/items/")
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 30
+
+
+def test_categories(client, catalog, assert_max_queries):
+    with assert_max_queries(2):
+        response = client.get("/categories/")
+    assert response.status_code == 200
+    assert len(response.json()["categories"]) == 3
+
+
+def test_basket(client, basket, assert_max_queries):
+    with assert_max_queries(4):
+        response = client.post(f"/basket/{USER_ID}")
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 10
+
+
+# Число запросов не зависит от числа строк корзины: запрос на строку — это N+1
+@pytest.mark.parametrize("lines", [1, 10])
+def test_order_from_basket(client, seed, catalog, assert_max_queries, lines):
+    seed_basket(seed, lines)
+    with assert_max_queries(ORDER_FROM_BASKET_QUERIES):
+        response = client.post(
+            f"/orders/from_basket/{USER_ID}",
+            json={"payment": "cash", "delivery": "Курьер", "address": "street 1"},
+            headers={"X-User-ID": str(USER_ID)},
+        )
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == lines
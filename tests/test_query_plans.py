@@ -0,0 +1,17 @@
+"""Планы горячих запросов (database/check_query_plans.py) без полных проходов по таблицам"""
+from database.check_query_plans import hot_queries, plan_report
+from database.db import engine
+
+
+def test_hot_queries_use_indexes(client):
+    async def run():
+        async with engine.connect() as conn:
+            try:
+                return await conn.run_sync(plan_report)
+            finally:
+                await conn.rollback()
+
+    report = client.portal.call(run)
+    assert report.keys() == hot_queries().keys()
+    full_scans = {name: scans for name, scans in report.items() if scans}
+    assert not full_scans, full_scans